@@ -1,3 +1,6 @@
+import sys
+
+from rex.dump import dump_tree
 from rex.lexer import Lexer
 from rex.nodes import NodeArrayCall, NodeInteger, NodeArgs
 from rex.parser import Parser
@@ -12,14 +15,9 @@ def read_code(path: str) -> str:
 
 def test_sample_lexer(path: str):
     print(f"{'LEXER RESULT':=^30}")
-    code = read_code(path)
-
-    rex = Lexer()
-    rex.setup(code)
-
-    while rex.next_token():
-        print(rex.token)
-    print(rex.token)
+    with open(path) as f:
+        for token in Lexer().iter_tokens(f):
+            print(token)
 
 
 def test_sample_parser(path: str):
@@ -27,7 +25,8 @@ def test_sample_parser(path: str):
     code = read_code(path)
     p: Parser = Parser()
     p.setup(code)
-    print(p.parse())
+    dump_tree(p.parse(), sys.stdout)
+    print()
 
 
 def test_sample_translator(path: str):
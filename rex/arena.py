@@ -0,0 +1,180 @@
+from array import array
+
+from rex.nodes import Node
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Kinds of the rows that are not nodes: a list held in a field and a None element of such a list
+LIST_KIND, NONE_KIND = 0, 1
+
+# Marks the fields of a literal tuple that hold children
+CHILD = object()
+
+
+class NodeView:
+    # Node of an arena, read from its columns. Nothing but the index is stored
+    __slots__ = ("arena", "index")
+
+    def __init__(self, arena: "AstArena", index: int):
+        self.arena = arena
+        self.index = index
+
+    @property
+    def type(self) -> type:
+        return self.arena.types[self.arena.kind[self.index]]
+
+    @property
+    def symbol_id(self) -> int:
+        return int(self.arena.symbol_id[self.index])
+
+    @property
+    def literal(self) -> tuple | None:
+        index = self.arena.literal_index[self.index]
+        return self.arena.literals[index] if index >= 0 else None
+
+    def children(self) -> list["NodeView"]:
+        return [NodeView(self.arena, index) for index in self.arena.children(self.index)]
+
+    def node(self) -> Node | list | None:
+        return self.arena.node(self.index)
+
+
+class AstArena:
+    # Tree kept as flat integer columns: kind, first child, next sibling, symbol id and literal index, -1 when
+    # there is none. A node has a child row for every field holding a node or a list, in the order of its fields,
+    # a list has a row for every element. Other field values of a node are kept in a tuple of literals. The
+    # annotations of the parser are not kept, except whether a node is a use of a definition
+    def __init__(self):
+        self.types: list[type] = [list, type(None)]
+        self.type_codes: dict[type, int] = {list: LIST_KIND, type(None): NONE_KIND}
+        self.kind = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.symbol_id = array("i")
+        self.literal_index = array("i")
+        self.literals: list[tuple] = list()
+        # 1 for the nodes read as uses of a definition
+        self.is_use = bytearray()
+
+    def __len__(self):
+        return len(self.kind)
+
+    @staticmethod
+    def from_tree(tree: Node) -> "AstArena":
+        arena = AstArena()
+        stack = [(arena.add_row(tree), tree)]
+        while stack:
+            index, value = stack.pop()
+            children = value if isinstance(value, list) else arena.node_children(value)
+            previous = -1
+            for child in children:
+                child_index = arena.add_row(child)
+                if previous < 0:
+                    arena.first_child[index] = child_index
+                else:
+                    arena.next_sibling[previous] = child_index
+                previous = child_index
+                if child is not None:
+                    stack.append((child_index, child))
+        arena.make_columns()
+        return arena
+
+    def node_children(self, node: Node) -> list:
+        return [value for value in (getattr(node, name) for name in node.fields) if isinstance(value, (Node, list))]
+
+    def add_row(self, value) -> int:
+        node_type = type(value)
+        code = self.type_codes.get(node_type)
+        if code is None:
+            code = len(self.types)
+            self.types.append(node_type)
+            self.type_codes[node_type] = code
+        self.kind.append(code)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+
+        symbol_id = literal_index = -1
+        is_use = 0
+        if isinstance(value, Node):
+            values = tuple(getattr(value, name) for name in value.fields)
+            if "name_id" in value.fields:
+                symbol_id = value.name_id
+            if not all(isinstance(v, (Node, list)) for v in values):
+                literal_index = len(self.literals)
+                self.literals.append(tuple(CHILD if isinstance(v, (Node, list)) else v for v in values))
+            is_use = value._definition is not None
+        self.symbol_id.append(symbol_id)
+        self.literal_index.append(literal_index)
+        self.is_use.append(is_use)
+        return len(self.kind) - 1
+
+    def make_columns(self):
+        # Columns become NumPy arrays sharing the memory of the built ones
+        if np is None:
+            return
+        self.kind = np.frombuffer(self.kind, dtype=np.intc)
+        self.first_child = np.frombuffer(self.first_child, dtype=np.intc)
+        self.next_sibling = np.frombuffer(self.next_sibling, dtype=np.intc)
+        self.symbol_id = np.frombuffer(self.symbol_id, dtype=np.intc)
+        self.literal_index = np.frombuffer(self.literal_index, dtype=np.intc)
+
+    def view(self, index: int = 0) -> NodeView:
+        return NodeView(self, index)
+
+    def children(self, index: int):
+        child = int(self.first_child[index])
+        while child >= 0:
+            yield child
+            child = int(self.next_sibling[child])
+
+    def node(self, index: int = 0) -> Node | list | None:
+        # Builds the nodes of the subtree, children before their parent
+        order = [index]
+        for i in order:
+            order.extend(self.children(i))
+        built = dict()
+        for i in reversed(order):
+            code = self.kind[i]
+            children = [built.pop(child) for child in self.children(i)]
+            if code == LIST_KIND:
+                built[i] = children
+                continue
+            if code == NONE_KIND:
+                built[i] = None
+                continue
+            node_type = self.types[code]
+            node = node_type.__new__(node_type)
+            Node.__init__(node)
+            literal_index = self.literal_index[i]
+            if literal_index < 0:
+                values = children
+            else:
+                children = iter(children)
+                values = [next(children) if v is CHILD else v for v in self.literals[literal_index]]
+            for name, value in zip(node_type.fields, values):
+                setattr(node, name, value)
+            built[i] = node
+        return built[index]
+
+    def nodes_of_type(self, node_type: type):
+        # Indices of the nodes of the type and its subclasses
+        codes = [code for t, code in self.type_codes.items() if issubclass(t, node_type)]
+        if np is None:
+            codes = set(codes)
+            return [i for i, code in enumerate(self.kind) if code in codes]
+        return np.flatnonzero(np.isin(self.kind, codes))
+
+    def use_counts(self, symbol_count: int = 0):
+        # Number of uses of every symbol id in the whole tree, the use counting of the dead code elimination
+        # without walking the nodes
+        if np is None:
+            counts = [0] * max(symbol_count, max(self.symbol_id, default=-1) + 1)
+            for symbol_id, is_use in zip(self.symbol_id, self.is_use):
+                if is_use:
+                    counts[symbol_id] += 1
+            return counts
+        uses = np.frombuffer(self.is_use, dtype=np.uint8).view(bool)
+        return np.bincount(self.symbol_id[uses], minlength=symbol_count)
@@ -0,0 +1,139 @@
+import json
+
+from rex.misc import trampoline
+from rex.nodes import Node
+from rex.symbols import Special
+
+
+class StreamParts:
+    # Parts written by describe() going to a file in chunks. Parts before one with other characters than newlines
+    # can no longer be changed by strip_newlines(), so only the parts after it are ever kept past a chunk
+    chunk_size = 4096
+
+    def __init__(self, file):
+        self.file = file
+        self.parts: list[str] = list()
+
+    def __bool__(self):
+        return bool(self.parts)
+
+    def __getitem__(self, index: int) -> str:
+        return self.parts[index]
+
+    def __setitem__(self, index: int, part: str):
+        self.parts[index] = part
+
+    def append(self, part: str):
+        if len(self.parts) >= self.chunk_size and part.strip("\n"):
+            self.flush()
+        self.parts.append(part)
+
+    def pop(self) -> str:
+        return self.parts.pop()
+
+    def flush(self):
+        self.file.write("".join(self.parts))
+        self.parts.clear()
+
+
+class SExpression:
+    separator = " "
+    list_start, list_end = "(", ")"
+    node_end = ")"
+
+    @staticmethod
+    def node_start(name: str) -> str:
+        return f"({name}"
+
+    @staticmethod
+    def truncated(name: str) -> str:
+        return f"({name} ...)"
+
+    @staticmethod
+    def field(name: str) -> str:
+        return f" :{name} "
+
+    @staticmethod
+    def scalar(value) -> str:
+        if value is None:
+            return "nil"
+        if isinstance(value, bool):
+            return "#t" if value else "#f"
+        if isinstance(value, (int, float)):
+            return str(value)
+        if isinstance(value, Special):
+            return value.name
+        return json.dumps(str(value), ensure_ascii=False)
+
+
+class Json:
+    separator = ", "
+    list_start, list_end = "[", "]"
+    node_end = "}"
+
+    @staticmethod
+    def node_start(name: str) -> str:
+        return f'{{"type": "{name}"'
+
+    @staticmethod
+    def truncated(name: str) -> str:
+        return f'{{"type": "{name}", "truncated": true}}'
+
+    @staticmethod
+    def field(name: str) -> str:
+        return f', "{name}": '
+
+    @staticmethod
+    def scalar(value) -> str:
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return json.dumps(value, ensure_ascii=False)
+        if isinstance(value, Special):
+            return json.dumps(value.name)
+        return json.dumps(str(value), ensure_ascii=False)
+
+
+def dump_tree(tree: Node, file, max_depth: int | None = None):
+    # Writes the same text as repr(tree), nodes deeper than max_depth are written without their fields
+    out = StreamParts(file)
+    trampoline(tree.describe(out, 0, max_depth))
+    out.flush()
+
+
+def dump_sexpr(tree: Node, file, max_depth: int | None = None):
+    serialize(tree, file, SExpression, max_depth)
+
+
+def dump_json(tree: Node, file, max_depth: int | None = None):
+    serialize(tree, file, Json, max_depth)
+
+
+def serialize(tree: Node, file, style, max_depth: int | None = None):
+    # Writes the tree in one line followed by a newline. The stack holds text to write and (value, depth) pairs
+    # still to be serialized, so the time is linear in the size of the tree and no recursion is needed
+    stack: list = [(tree, 0)]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            file.write(item)
+            continue
+        value, depth = item
+        if isinstance(value, Node):
+            name = value.__class__.__name__
+            if max_depth is not None and depth >= max_depth:
+                file.write(style.truncated(name))
+                continue
+            file.write(style.node_start(name))
+            stack.append(style.node_end)
+            for field in reversed(value.fields):
+                stack.append((getattr(value, field), depth + 1))
+                stack.append(style.field(field))
+        elif isinstance(value, list):
+            file.write(style.list_start)
+            stack.append(style.list_end)
+            for i in range(len(value) - 1, -1, -1):
+                stack.append((value[i], depth))
+                if i:
+                    stack.append(style.separator)
+        else:
+            file.write(style.scalar(value))
+    file.write("\n")
@@ -0,0 +1,270 @@
+import os
+import re
+import sys
+from enum import Enum
+
+from rex.symbols import Special, token_kinds
+
+grammar_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "grammar.ebnf")
+tables_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar_tables.py")
+
+# Terminals of the grammar named differently from the lexer tokens
+terminal_aliases = {
+    "STRING": "STR",
+}
+
+ebnf_token = re.compile(r'\s*(?:(\(\*.*?\*\))|"([A-Z_]+)"|([a-z_]+)|([=|,;\[\]{}()]))', re.DOTALL)
+
+
+class GrammarError(Exception):
+    pass
+
+
+# Grammar expressions are tuples: ("t", symbol), ("nt", name), ("seq", items), ("alt", items), ("opt", item),
+# ("rep", item)
+def read_grammar(text: str) -> dict[str, tuple]:
+    symbols = {symbol.name: symbol for symbol in token_kinds}
+    tokens = list()
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = ebnf_token.match(text, position)
+        if match is None:
+            raise GrammarError(f"Неожиданный символ {text[position]!r} в грамматике")
+        position = match.end()
+        comment, terminal, name, punct = match.groups()
+        if terminal:
+            terminal = terminal_aliases.get(terminal, terminal)
+            if terminal not in symbols:
+                raise GrammarError(f"Неизвестный терминал {terminal}")
+            tokens.append(("t", symbols[terminal]))
+        elif name:
+            tokens.append(("nt", name))
+        elif punct:
+            tokens.append(("p", punct))
+    tokens.append(("p", None))
+
+    index = 0
+
+    def peek():
+        return tokens[index]
+
+    def expect(punct):
+        nonlocal index
+        if tokens[index] != ("p", punct):
+            raise GrammarError(f"Ожидался символ {punct!r}, получен {tokens[index][1]!r}")
+        index += 1
+
+    def alternatives():
+        items = [sequence()]
+        while peek() == ("p", "|"):
+            expect("|")
+            items.append(sequence())
+        return items[0] if len(items) == 1 else ("alt", tuple(items))
+
+    def sequence():
+        items = [term()]
+        while peek() == ("p", ","):
+            expect(",")
+            items.append(term())
+        return items[0] if len(items) == 1 else ("seq", tuple(items))
+
+    def term():
+        nonlocal index
+        kind, value = peek()
+        if kind in ("t", "nt"):
+            index += 1
+            return kind, value
+        for opening, closing, wrap in (("[", "]", "opt"), ("{", "}", "rep"), ("(", ")", None)):
+            if value == opening:
+                expect(opening)
+                item = alternatives()
+                expect(closing)
+                return (wrap, item) if wrap else item
+        raise GrammarError(f"Неожиданный символ {value!r} в грамматике")
+
+    rules = dict()
+    while peek() != ("p", None):
+        kind, name = peek()
+        if kind != "nt":
+            raise GrammarError(f"Ожидалось имя правила, получен {name!r}")
+        index += 1
+        expect("=")
+        rules[name] = alternatives()
+        expect(";")
+
+    for name, expr in rules.items():
+        for used in nonterminals_of(expr):
+            if used not in rules:
+                raise GrammarError(f"Правило {used} используется в {name}, но не объявлено")
+    return rules
+
+
+def nonterminals_of(expr: tuple):
+    kind, value = expr
+    if kind == "nt":
+        yield value
+    elif kind in ("seq", "alt"):
+        for item in value:
+            yield from nonterminals_of(item)
+    elif kind in ("opt", "rep"):
+        yield from nonterminals_of(value)
+
+
+def first_of(expr: tuple, first: dict[str, set], nullable: dict[str, bool]) -> tuple[set, bool]:
+    kind, value = expr
+    if kind == "t":
+        return {value}, False
+    if kind == "nt":
+        return first[value], nullable[value]
+    if kind == "seq":
+        result = set()
+        for item in value:
+            item_first, item_nullable = first_of(item, first, nullable)
+            result |= item_first
+            if not item_nullable:
+                return result, False
+        return result, True
+    if kind == "alt":
+        result = set()
+        any_nullable = False
+        for item in value:
+            item_first, item_nullable = first_of(item, first, nullable)
+            result |= item_first
+            any_nullable = any_nullable or item_nullable
+        return result, any_nullable
+    return first_of(value, first, nullable)[0], True
+
+
+def first_sets(rules: dict[str, tuple]) -> tuple[dict[str, set], dict[str, bool]]:
+    first = {name: set() for name in rules}
+    nullable = {name: False for name in rules}
+    changed = True
+    while changed:
+        changed = False
+        for name, expr in rules.items():
+            expr_first, expr_nullable = first_of(expr, first, nullable)
+            if not expr_first <= first[name] or expr_nullable != nullable[name]:
+                first[name] |= expr_first
+                nullable[name] = nullable[name] or expr_nullable
+                changed = True
+    return first, nullable
+
+
+def follow_sets(rules: dict[str, tuple], start: str, end: Enum, first: dict[str, set],
+                nullable: dict[str, bool]) -> dict[str, set]:
+    follow = {name: set() for name in rules}
+    follow[start].add(end)
+
+    def walk(expr, trailer: set) -> bool:
+        kind, value = expr
+        if kind == "nt":
+            if not trailer <= follow[value]:
+                follow[value] |= trailer
+                return True
+            return False
+        if kind == "seq":
+            grown = False
+            for item in reversed(value):
+                grown = walk(item, trailer) or grown
+                item_first, item_nullable = first_of(item, first, nullable)
+                trailer = item_first | trailer if item_nullable else set(item_first)
+            return grown
+        if kind == "alt":
+            grown = False
+            for item in value:
+                grown = walk(item, trailer) or grown
+            return grown
+        if kind == "opt":
+            return walk(value, trailer)
+        if kind == "rep":
+            return walk(value, first_of(value, first, nullable)[0] | trailer)
+        return False
+
+    changed = True
+    while changed:
+        changed = False
+        for name, expr in rules.items():
+            changed = walk(expr, set(follow[name])) or changed
+    return follow
+
+
+def alternatives_of(expr: tuple) -> tuple:
+    return expr[1] if expr[0] == "alt" else (expr,)
+
+
+def ll1_conflicts(rules: dict[str, tuple], first: dict[str, set], nullable: dict[str, bool]) -> dict[str, set]:
+    # Tokens starting more than one alternative of a rule, such rules can not be dispatched on a single token
+    conflicts = dict()
+    for name, expr in rules.items():
+        seen = set()
+        for alternative in alternatives_of(expr):
+            alternative_first = first_of(alternative, first, nullable)[0]
+            if seen & alternative_first:
+                conflicts.setdefault(name, set()).update(seen & alternative_first)
+            seen |= alternative_first
+    return conflicts
+
+
+def dispatch_table(rule: str, rules: dict[str, tuple], first: dict[str, set],
+                   nullable: dict[str, bool]) -> dict[Enum, str]:
+    # Alternative of the rule started by every token, named after the first element of the alternative
+    table = dict()
+    for alternative in alternatives_of(rules[rule]):
+        head = alternative[1][0] if alternative[0] == "seq" else alternative
+        label = head[1] if head[0] == "nt" else head[1].name
+        for token in first_of(alternative, first, nullable)[0]:
+            if token in table:
+                raise GrammarError(f"Правило {rule} не является LL(1): токен {token} начинает несколько альтернатив")
+            table[token] = label
+    return table
+
+
+def format_symbols(symbols) -> str:
+    names = sorted(f"{type(s).__name__}.{s.name}" for s in symbols)
+    return f"frozenset({{{', '.join(names)}}})" if names else "frozenset()"
+
+
+def generate_tables(text: str) -> str:
+    rules = read_grammar(text)
+    first, nullable = first_sets(rules)
+    follow = follow_sets(rules, "program", Special.EOF, first, nullable)
+    stmt_dispatch = dispatch_table("stmt", rules, first, nullable)
+
+    lines = [
+        "# Generated from grammar.ebnf by `python -m rex.grammar`, do not edit by hand",
+        "from rex.symbols import KeyWords, Special, Reserved, Operators",
+        "",
+        "FIRST = {",
+        *(f"    {name!r}: {format_symbols(first[name])}," for name in rules),
+        "}",
+        "",
+        "FOLLOW = {",
+        *(f"    {name!r}: {format_symbols(follow[name])}," for name in rules),
+        "}",
+        "",
+        "# Alternative of <stmt> started by each token",
+        "STMT_DISPATCH = {",
+        *(f"    {type(token).__name__}.{token.name}: {label!r},"
+          for token, label in sorted(stmt_dispatch.items(), key=lambda item: f"{type(item[0]).__name__}.{item[0].name}")),
+        "}",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def main(argv: list[str]):
+    source = argv[1] if len(argv) > 1 else grammar_path
+    target = argv[2] if len(argv) > 2 else tables_path
+    with open(source, encoding="utf-8") as f:
+        text = f.read()
+    rules = read_grammar(text)
+    first, nullable = first_sets(rules)
+    for name, tokens in ll1_conflicts(rules, first, nullable).items():
+        print(f"{name}: LL(1) conflict on {', '.join(sorted(str(t) for t in tokens))}")
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(generate_tables(text))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
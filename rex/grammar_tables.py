@@ -0,0 +1,67 @@
+# Generated from grammar.ebnf by `python -m rex.grammar`, do not edit by hand
+from rex.symbols import KeyWords, Special, Reserved, Operators
+
+FIRST = {
+    'program': frozenset({KeyWords.BREAK, KeyWords.FOR, KeyWords.FUNCTION, KeyWords.IF, KeyWords.NEXT, KeyWords.RETURN, KeyWords.UNTIL, KeyWords.WHILE, Special.ID}),
+    'new_line': frozenset({Special.NEWLINE, Special.SEMICOLON}),
+    'block': frozenset({KeyWords.BREAK, KeyWords.FOR, KeyWords.FUNCTION, KeyWords.IF, KeyWords.NEXT, KeyWords.RETURN, KeyWords.UNTIL, KeyWords.WHILE, Special.ID}),
+    'stmt': frozenset({KeyWords.BREAK, KeyWords.FOR, KeyWords.FUNCTION, KeyWords.IF, KeyWords.NEXT, KeyWords.RETURN, KeyWords.UNTIL, KeyWords.WHILE, Special.ID}),
+    'func_def': frozenset({KeyWords.FUNCTION}),
+    'func_call': frozenset({Special.ID}),
+    'if_stmt': frozenset({KeyWords.IF}),
+    'cycle_stmt': frozenset({KeyWords.FOR, KeyWords.UNTIL, KeyWords.WHILE}),
+    'arg': frozenset({KeyWords.NOT, Operators.MINUS, Operators.PLUS, Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.ID, Special.INTEGER, Special.LBR, Special.LPAR, Special.STR}),
+    'args': frozenset({KeyWords.NOT, Operators.MINUS, Operators.PLUS, Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.ID, Special.INTEGER, Special.LBR, Special.LPAR, Special.STR}),
+    'primary': frozenset({Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.ID, Special.INTEGER, Special.LBR, Special.STR}),
+    'lhs': frozenset({Special.ID}),
+    'rhs': frozenset({Special.ID}),
+    'then': frozenset({KeyWords.THEN, Special.NEWLINE, Special.SEMICOLON}),
+    'do': frozenset({KeyWords.DO, Special.NEWLINE, Special.SEMICOLON}),
+    'bin_op': frozenset({KeyWords.AND, KeyWords.OR, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH}),
+    'unar_op': frozenset({KeyWords.NOT, Operators.MINUS, Operators.PLUS}),
+    'asgn_op': frozenset({Operators.ASTERISK_EQUALS, Operators.DEGREE_EQUALS, Operators.EQUALS, Operators.MINUS_EQUALS, Operators.MOD_EQUALS, Operators.PLUS_EQUALS, Operators.SLASH_EQUALS}),
+    'comp_op': frozenset({Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.NOT_EQUALS}),
+    'variable': frozenset({Special.ID}),
+    'literal': frozenset({Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.INTEGER, Special.STR}),
+    'numeric': frozenset({Special.FLOAT, Special.INTEGER}),
+    'boolean': frozenset({Reserved.FALSE, Reserved.TRUE}),
+}
+
+FOLLOW = {
+    'program': frozenset({Special.EOF}),
+    'new_line': frozenset({KeyWords.BREAK, KeyWords.DO, KeyWords.FOR, KeyWords.FUNCTION, KeyWords.IF, KeyWords.NEXT, KeyWords.RETURN, KeyWords.THEN, KeyWords.UNTIL, KeyWords.WHILE, Special.ID}),
+    'block': frozenset({KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, Special.EOF}),
+    'stmt': frozenset({KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, Special.EOF, Special.NEWLINE, Special.SEMICOLON}),
+    'func_def': frozenset({KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, Special.EOF, Special.NEWLINE, Special.SEMICOLON}),
+    'func_call': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'if_stmt': frozenset({KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, Special.EOF, Special.NEWLINE, Special.SEMICOLON}),
+    'cycle_stmt': frozenset({KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, Special.EOF, Special.NEWLINE, Special.SEMICOLON}),
+    'arg': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'args': frozenset({KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'primary': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'lhs': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.ASTERISK_EQUALS, Operators.DEGREE, Operators.DEGREE_EQUALS, Operators.DOUBLE_EQUALS, Operators.EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MINUS_EQUALS, Operators.MOD, Operators.MOD_EQUALS, Operators.NOT_EQUALS, Operators.PLUS, Operators.PLUS_EQUALS, Operators.SLASH, Operators.SLASH_EQUALS, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'rhs': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'then': frozenset({KeyWords.BREAK, KeyWords.FOR, KeyWords.FUNCTION, KeyWords.IF, KeyWords.NEXT, KeyWords.RETURN, KeyWords.UNTIL, KeyWords.WHILE, Special.ID}),
+    'do': frozenset({KeyWords.BREAK, KeyWords.FOR, KeyWords.FUNCTION, KeyWords.IF, KeyWords.NEXT, KeyWords.RETURN, KeyWords.UNTIL, KeyWords.WHILE, Special.ID}),
+    'bin_op': frozenset({KeyWords.NOT, Operators.MINUS, Operators.PLUS, Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.ID, Special.INTEGER, Special.LBR, Special.LPAR, Special.STR}),
+    'unar_op': frozenset({KeyWords.NOT, Operators.MINUS, Operators.PLUS, Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.ID, Special.INTEGER, Special.LBR, Special.LPAR, Special.STR}),
+    'asgn_op': frozenset({KeyWords.NOT, Operators.MINUS, Operators.PLUS, Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.ID, Special.INTEGER, Special.LBR, Special.LPAR, Special.STR}),
+    'comp_op': frozenset({KeyWords.NOT, Operators.MINUS, Operators.PLUS, Reserved.FALSE, Reserved.NIL, Reserved.TRUE, Special.FLOAT, Special.ID, Special.INTEGER, Special.LBR, Special.LPAR, Special.STR}),
+    'variable': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.IN, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.ASTERISK_EQUALS, Operators.DEGREE, Operators.DEGREE_EQUALS, Operators.DOUBLE_EQUALS, Operators.EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MINUS_EQUALS, Operators.MOD, Operators.MOD_EQUALS, Operators.NOT_EQUALS, Operators.PLUS, Operators.PLUS_EQUALS, Operators.SLASH, Operators.SLASH_EQUALS, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.LBR, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'literal': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'numeric': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+    'boolean': frozenset({KeyWords.AND, KeyWords.DO, KeyWords.ELSE, KeyWords.ELSIF, KeyWords.END, KeyWords.OR, KeyWords.THEN, Operators.ASTERISK, Operators.DEGREE, Operators.DOUBLE_EQUALS, Operators.GREATER, Operators.GREATER_EQUAL, Operators.LESS, Operators.LESS_EQUAL, Operators.MINUS, Operators.MOD, Operators.NOT_EQUALS, Operators.PLUS, Operators.SLASH, Special.COMMA, Special.DOUBLE_DOT, Special.EOF, Special.NEWLINE, Special.RBR, Special.RPAR, Special.SEMICOLON}),
+}
+
+# Alternative of <stmt> started by each token
+STMT_DISPATCH = {
+    KeyWords.BREAK: 'BREAK',
+    KeyWords.FOR: 'cycle_stmt',
+    KeyWords.FUNCTION: 'func_def',
+    KeyWords.IF: 'if_stmt',
+    KeyWords.NEXT: 'NEXT',
+    KeyWords.RETURN: 'RETURN',
+    KeyWords.UNTIL: 'cycle_stmt',
+    KeyWords.WHILE: 'cycle_stmt',
+    Special.ID: 'lhs',
+}
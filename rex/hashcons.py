@@ -0,0 +1,87 @@
+from hashlib import blake2b
+
+from rex.nodes import Node
+
+
+class NodeFactory:
+    # Hash-consing: one shared node per structurally equal subtree. Nodes made by a factory must not be changed,
+    # two of them are equal exactly when they are the same object. They carry none of the parser annotations
+    def __init__(self):
+        # Shared node by its type and field values, children given by the id of their shared node
+        self.table: dict[tuple, Node] = dict()
+        # Shared nodes by their id, the table keeps them alive so the ids are not reused
+        self.nodes: dict[int, Node] = dict()
+        # Hash of every shared node, the same from run to run
+        self.hashes: dict[int, int] = dict()
+
+    def __len__(self):
+        return len(self.table)
+
+    def make(self, node_type: type, *values) -> Node:
+        # Shared node of the type with the values of its fields, children must be made by this factory
+        key = (node_type, tuple(self.value_key(value) for value in values))
+        node = self.table.get(key)
+        if node is not None:
+            return node
+
+        node = node_type.__new__(node_type)
+        Node.__init__(node)
+        digest = blake2b(node_type.__name__.encode(), digest_size=8)
+        for name, value in zip(node_type.fields, values):
+            if isinstance(value, list):
+                value = list(value)
+                digest.update(b"[")
+                for item in value:
+                    digest.update(self.value_digest(item))
+                digest.update(b"]")
+            else:
+                digest.update(self.value_digest(value))
+            setattr(node, name, value)
+        self.table[key] = node
+        self.nodes[id(node)] = node
+        self.hashes[id(node)] = int.from_bytes(digest.digest(), "little")
+        return node
+
+    def value_key(self, value):
+        if isinstance(value, Node):
+            if self.nodes.get(id(value)) is not value:
+                raise ValueError(f"Узел {type(value).__name__} создан не этой фабрикой, используйте intern()")
+            return id(value)
+        if isinstance(value, list):
+            return tuple(self.value_key(item) for item in value)
+        return type(value), value
+
+    def value_digest(self, value) -> bytes:
+        if isinstance(value, Node):
+            return b"N" + self.hashes[id(value)].to_bytes(8, "little")
+        return f"{type(value).__name__}:{value!r};".encode()
+
+    def hash(self, node: Node) -> int:
+        self.value_key(node)
+        return self.hashes[id(node)]
+
+    def intern(self, tree: Node) -> Node:
+        # Shared copy of the tree, children are made before their parent so no recursion is needed
+        order = [tree]
+        for node in order:
+            for name in node.fields:
+                value = getattr(node, name)
+                if isinstance(value, Node):
+                    order.append(value)
+                elif isinstance(value, list):
+                    order.extend(item for item in value if isinstance(item, Node))
+
+        shared = dict()
+        for node in reversed(order):
+            if id(node) in shared:
+                continue
+            values = []
+            for name in node.fields:
+                value = getattr(node, name)
+                if isinstance(value, Node):
+                    value = shared[id(value)]
+                elif isinstance(value, list):
+                    value = [shared[id(item)] if isinstance(item, Node) else item for item in value]
+                values.append(value)
+            shared[id(node)] = self.make(type(node), *values)
+        return shared[id(tree)]
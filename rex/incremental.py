@@ -0,0 +1,244 @@
+from rex.names import NameTable
+from rex.nodes import Node, NodeProgram, NodeFuncDec, NodeEquals
+from rex.parser import Parser, ID_CODE, END_CODE, NEWLINE_CODE, EOF_CODE, block_codes
+from rex.symbols import Special, token_codes
+from rex.token_buffer import TokenBuffer
+
+# Characters compared at once when looking for the edited part of the code
+compare_block = 4096
+
+# Tokens a top level statement stops at
+statement_end_codes = frozenset({NEWLINE_CODE, token_codes[Special.SEMICOLON], EOF_CODE})
+
+
+def common_prefix(a: str, b: str, limit: int) -> int:
+    i = 0
+    while i + compare_block <= limit and a[i:i + compare_block] == b[i:i + compare_block]:
+        i += compare_block
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def common_suffix(a: str, b: str, limit: int) -> int:
+    i = 0
+    while i + compare_block <= limit and a[len(a) - i - compare_block:len(a) - i] == b[len(b) - i - compare_block:len(b) - i]:
+        i += compare_block
+    while i < limit and a[len(a) - i - 1] == b[len(b) - i - 1]:
+        i += 1
+    return i
+
+
+def binding_key(variables: dict, functions: dict, name_id: int) -> tuple:
+    # What parsing a statement can learn about a global name
+    variable = variables.get(name_id)
+    function = functions.get(name_id)
+    variable = variable[-1] if variable is not None else None
+    function = function[-1] if function is not None else None
+    return (
+        type(variable), getattr(variable, "type", None),
+        type(function), getattr(function, "args_count", None), getattr(function, "predefined_construction", None),
+    )
+
+
+def defined_name(node: Node) -> int | None:
+    if isinstance(node, NodeFuncDec):
+        return node.name_id
+    if isinstance(node, NodeEquals):
+        return node.left.name_id
+    return None
+
+
+class CachedStatement:
+    def __init__(self, node: Node, length: int, names: tuple, env: tuple):
+        self.node = node
+        # Number of tokens of the statement, the token ending it is not counted
+        self.length = length
+        # Global names the statement refers to and their bindings before it
+        self.names = names
+        self.env = env
+        # Uses of global definitions made by the statement: (is_function, name_id, nodes, dropped_uses)
+        self.uses: list[tuple[bool, int, list, int]] = list()
+        # Uses of the definition made by the statement itself
+        self.own_uses: list = list()
+        self.own_dropped_uses = 0
+        # Dead code removed inside the statement
+        self.removed_statements = 0
+        self.removed_symbols = 0
+        # Generated code, filled on the first translation
+        self.code: str | None = None
+
+
+class IncrementalParser(Parser):
+    # Parses successive versions of a program, reusing the top level statements whose tokens and global
+    # bindings did not change since the previous version
+    def __init__(self):
+        super().__init__()
+        self.names = NameTable()
+        self.code: str | None = None
+        self.buffer: TokenBuffer | None = None
+        # Statements of the last successful parse keyed by the token index they start at
+        self.cache: dict[int, CachedStatement] = dict()
+        # Statements of the parse in progress
+        self.parsed: dict[int, CachedStatement] = dict()
+        self.statements: dict[int, CachedStatement] = dict()
+        # Edit since the last parse: first changed character, first character after it and token count change
+        self.edit_start = 0
+        self.edit_end = 0
+        self.token_delta = 0
+        # Binding keys of global names, dropped when a statement redefines the name
+        self.binding_keys: dict[int, tuple] = dict()
+        self.reused = 0
+
+    def update(self, code: str) -> NodeProgram:
+        old = self.buffer
+        if old is None:
+            buffer = TokenBuffer.tokenize(code, names=self.names)
+            self.edit_start = self.edit_end = 0
+        else:
+            limit = min(len(old.source), len(code))
+            start = common_prefix(old.source, code, limit)
+            suffix = common_suffix(old.source, code, limit - start)
+            buffer = old.relex(code, start, len(old.source) - suffix, len(code) - suffix)
+            self.edit_start = start
+            self.edit_end = len(code) - suffix
+        self.token_delta = len(buffer) - (len(old) if old is not None else 0)
+
+        self.setup(buffer)
+        self.parsed = dict()
+        self.binding_keys = dict()
+        self.reused = 0
+        program = self.parse()
+
+        # Only a successful parse replaces the cache, the next edit is then compared against its code
+        self.buffer = buffer
+        self.code = code
+        self.cache = self.parsed
+        self.statements = {id(entry.node): entry for entry in self.parsed.values()}
+        return program
+
+    def translate(self, code: str) -> str:
+        program = self.update(code)
+        result = []
+        for stmt in program.child:
+            entry = self.statements.get(id(stmt))
+            if entry is None:
+                result.append(stmt.generate())
+                continue
+            if entry.code is None:
+                entry.code = stmt.generate()
+            result.append(entry.code)
+        result.append("")
+        return "\n".join(result)
+
+    def top_level_statement(self) -> Node | None:
+        start = self.lexer.index
+        entry = self.find_cached(start)
+        if entry is not None:
+            self.reuse(entry)
+            self.parsed[start] = entry
+            self.binding_keys.pop(defined_name(entry.node), None)
+            return entry.node
+
+        buffer = self.lexer.buffer
+        variables, functions = self.symtable.variables, self.symtable.functions
+        end = self.statement_end(start)
+        names = tuple(sorted({buffer.name_ids[i] for i in range(start, end) if buffer.kinds[i] == ID_CODE}))
+        env = tuple(self.binding_key(name_id) for name_id in names)
+        before = [
+            (is_function, name_id, bindings[name_id][-1], len(bindings[name_id][-1].uses),
+             bindings[name_id][-1].dropped_uses)
+            for name_id in names
+            for is_function, bindings in ((False, variables), (True, functions))
+            if name_id in bindings
+        ]
+        removed_statements, removed_symbols = self.removed_statements, self.removed_symbols
+
+        node = self.statement()
+        self.binding_keys.pop(defined_name(node), None)
+        if node is None or self.lexer.index != end or self.lexer.overrun:
+            return node
+
+        entry = CachedStatement(node, end - start, names, env)
+        for is_function, name_id, definition, uses, dropped_uses in before:
+            if len(definition.uses) > uses or definition.dropped_uses != dropped_uses:
+                entry.uses.append((is_function, name_id, definition.uses[uses:], definition.dropped_uses - dropped_uses))
+        if node._defines is not None:
+            entry.own_uses = list(node._defines.uses)
+            entry.own_dropped_uses = node._defines.dropped_uses
+        entry.removed_statements = self.removed_statements - removed_statements
+        entry.removed_symbols = self.removed_symbols - removed_symbols
+        self.parsed[start] = entry
+        return node
+
+    def statement_end(self, start: int) -> int:
+        # Token the statement is expected to stop at, a statement stopping elsewhere is not cached
+        kinds = self.lexer.buffer.kinds
+        depth = 0
+        for i in range(start, len(kinds)):
+            kind = kinds[i]
+            if kind in block_codes:
+                depth += 1
+            elif kind == END_CODE:
+                depth -= 1
+            elif depth <= 0 and kind in statement_end_codes:
+                return i
+        return len(kinds) - 1
+
+    def find_cached(self, start: int) -> CachedStatement | None:
+        if not self.cache:
+            return None
+        buffer = self.lexer.buffer
+        position = buffer.starts[start]
+        if position < self.edit_start:
+            old_start = start
+        elif position >= self.edit_end:
+            old_start = start - self.token_delta
+        else:
+            return None
+        entry = self.cache.get(old_start)
+        if entry is None:
+            return None
+
+        old = self.buffer
+        end, old_end = start + entry.length, old_start + entry.length
+        if end >= len(buffer) or buffer.kinds[start:end + 1] != old.kinds[old_start:old_end + 1]:
+            return None
+        if buffer.source[buffer.starts[start]:buffer.ends[end]] != old.source[old.starts[old_start]:old.ends[old_end]]:
+            return None
+        binding_key = self.binding_key
+        for name_id, key in zip(entry.names, entry.env):
+            if binding_key(name_id) != key:
+                return None
+        return entry
+
+    def binding_key(self, name_id: int) -> tuple:
+        key = self.binding_keys.get(name_id)
+        if key is None:
+            key = binding_key(self.symtable.variables, self.symtable.functions, name_id)
+            self.binding_keys[name_id] = key
+        return key
+
+    def reuse(self, entry: CachedStatement):
+        variables, functions = self.symtable.variables, self.symtable.functions
+        for is_function, name_id, nodes, dropped_uses in entry.uses:
+            definition = (functions if is_function else variables)[name_id][-1]
+            for node in nodes:
+                definition.add_use(node)
+            definition.dropped_uses += dropped_uses
+
+        node = entry.node
+        definition = node._defines
+        if definition is not None:
+            definition.uses = list(entry.own_uses)
+            definition.dropped_uses = entry.own_dropped_uses
+            if isinstance(node, NodeFuncDec):
+                self.symtable.add_function(node.name_id, definition)
+            else:
+                self.symtable.add_variable(node.left.name_id, definition)
+        self.removed_statements += entry.removed_statements
+        self.removed_symbols += entry.removed_symbols
+        self.reused += 1
+
+        self.lexer.seek(self.lexer.index + entry.length)
+        self.token = self.lexer.symbol
@@ -1,4 +1,9 @@
+import codecs
+import mmap
+import os
 import re
+from array import array
+from bisect import bisect_right
 
 from rex.symbols import *
 
@@ -27,10 +32,26 @@ class Transliterator:
 
 
 class Token:
-    def __init__(self, token: Enum, value: str = None, pos: tuple[int, int] = None):
+    def __init__(
+            self, token: Enum, value: str = None, pos: tuple[int, int] = None,
+            offset: int = -1, lines: "LineIndex" = None
+    ):
         self.symbol = token
         self.value = value
-        self.pos = pos if pos is not None else (-1, -1)
+        # Tokens of the regex scanner keep a raw offset, line and column are looked up on demand
+        self.offset = offset
+        self.lines = lines
+        self.fixed_pos = pos if pos is not None else (-1, -1)
+
+    @property
+    def pos(self) -> tuple[int, int]:
+        if self.lines is None:
+            return self.fixed_pos
+        return self.lines.pos(self.offset)
+
+    def resolve(self):
+        self.fixed_pos = self.pos
+        self.lines = None
 
     def __str__(self):
         return (
@@ -47,21 +68,142 @@ class Token:
         )
 
 
+class LazyToken(Token):
+    def __init__(self, token: Enum, source, start: int, end: int, offset: int, lines: "LineIndex"):
+        self.symbol = token
+        self.source = source
+        self.start = start
+        self.end = end
+        self.offset = offset
+        self.lines = lines
+
+    @property
+    def value(self) -> str | None:
+        if self.end < 0:
+            return None
+        return str(self.source[self.start:self.end], "utf-8")
+
+
+class LineIndex:
+    def __init__(self, source=None):
+        # Bytes-like source to count line chars in, None for text
+        self.source = source
+        # Every line break: the offset the next line number applies from and the offset of that line
+        self.breaks = array("q")
+        self.starts = array("q")
+        # Line number and offset of the first line that is still indexed
+        self.first_line = 1
+        self.first_start = 0
+
+    def __len__(self):
+        return len(self.breaks)
+
+    @property
+    def line(self) -> int:
+        return self.first_line + len(self.breaks)
+
+    @property
+    def start(self) -> int:
+        return self.starts[-1] if self.starts else self.first_start
+
+    def add(self, offset: int, start: int):
+        self.breaks.append(offset)
+        self.starts.append(start)
+
+    def truncate(self, size: int):
+        del self.breaks[size:]
+        del self.starts[size:]
+
+    def rebase(self, shift: int):
+        # Forget the indexed lines and move the current one by shift
+        self.first_line, self.first_start = self.line, self.start - shift
+        self.truncate(0)
+
+    def resolve(self, offset: int) -> tuple[int, int]:
+        i = bisect_right(self.breaks, offset)
+        return self.first_line + i, (self.starts[i - 1] if i else self.first_start)
+
+    def pos(self, offset: int) -> tuple[int, int]:
+        line, start = self.resolve(offset)
+        if self.source is None:
+            return line, offset - start + 1
+        return line, get_byte_column(self.source, start, offset)
+
+
+def get_byte_column(source, line_start: int, offset: int) -> int:
+    end = min(offset, len(source))
+    if end <= line_start:
+        return offset - line_start + 1
+    return len(str(source[line_start:end], "utf-8")) + offset - end + 1
+
+
+def get_byte_offset(text: str, index: int) -> int:
+    return len(text[:index].encode()) + max(0, index - len(text))
+
+
+def map_file(path: str):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# The master pattern matches only well-formed tokens. Anything it rejects (errors,
+# non-ASCII identifiers and digits) is scanned char by char to keep the old messages.
+def build_master_pattern() -> str:
+    single_char_ops = "".join(re.escape(op) for op in ops if len(op) == 1)
+    number_end = rf"(?=[\s{single_char_ops})\]]|\Z)"
+    operators = "|".join(re.escape(op) for op in sorted(ops, key=len, reverse=True))
+    brackets_chars = "".join(re.escape(b) for b in brackets)
+
+    return (
+        r"[^\S\n]*+(?:"
+        r"(?P<NEWLINE>\n)"
+        r"|(?P<RANGE_INT>[0-9]++(?=\.\.))"
+        r"|(?P<FLOAT>(?>(?:0|[1-9][0-9]*+)\.[0-9]++(?:[eE][-+]?[0-9]++)?))" + number_end +
+        r"|(?P<INTEGER>(?>(?:0|[1-9][0-9]*+)(?!\.[0-9]|\.[^\x00-\x7f])(?:[eE][-+]?[0-9]++)?))" + number_end +
+        r"|(?P<ID>[A-Za-z][A-Za-z0-9_]*+\??+)(?![\w?]|[^\x00-\x7f])"
+        rf"|(?P<OP>{operators})"
+        rf"|(?P<BRACKET>[{brackets_chars}])"
+        r"|#(?P<COMMENT>[^\n]*+)"
+        r"|\"(?P<DQ_STR>[^\"]*+)\""
+        r"|'(?P<SQ_STR>[^']*+)'"
+        r"|(?P<EOF>\Z)"
+        r")"
+    )
+
+
+master_pattern = re.compile(build_master_pattern())
+bytes_master_pattern = re.compile(build_master_pattern().encode())
+bytes_quote_pattern = re.compile(rb"[^\n'\"]*+['\"]")
+bytes_newline_pattern = re.compile(rb"\n")
+bytes_ops = {op.encode(): symbol for op, symbol in ops.items()}
+bytes_brackets = {bracket.encode(): symbol for bracket, symbol in brackets.items()}
+bytes_keywords = {word.encode(): symbol for word, symbol in keywords.items()}
+
+
 class Lexer:
-    def __init__(self):
+    def __init__(self, use_regex: bool = True):
         self.code: str = str()
+        self.source = None
         self.char_pos: int = 0
         self.position: int = -1
         self.line: int = 1
+        self.token_start: int = 0
         self.token: Token | None = None
+        self.lines = LineIndex()
         self.trnslt = Transliterator()
+        self.use_regex = use_regex
 
-    def setup(self, code: str):
-        self.code: str = code
+    def setup(self, code):
+        # Any bytes-like source (bytes, mmap, memoryview) is lexed without decoding it
+        self.code: str = code if isinstance(code, str) else str()
+        self.source = None if isinstance(code, str) else code
         self.char_pos: int = 0
         self.position: int = -1
         self.line: int = 1
         self.token: Token | None = None
+        self.lines = LineIndex(self.source)
 
     @property
     def pos(self):
@@ -76,6 +218,184 @@ class Lexer:
         raise LexicalError(f"({self.line - 1}, {self.char_pos}) : {message}")
 
     def next_token(self) -> bool:
+        if not self.use_regex:
+            return self.next_token_by_chars()
+        if self.source is not None:
+            return self.next_token_bytes()
+
+        code = self.code
+        m = master_pattern.match(code, self.position + 1)
+        if m is None:
+            return self.next_token_fallback()
+
+        kind = m.lastgroup
+        start = m.start(kind)
+        end = m.end()
+        lines = self.lines
+
+        if kind == "ID":
+            value = m.group(kind)
+            if value in keywords:
+                self.token = Token(keywords[value], None, None, start, lines)
+            else:
+                self.token = Token(Special.ID, value, None, start, lines)
+        elif kind == "OP":
+            self.token = Token(ops[m.group(kind)], None, None, start, lines)
+            if end == len(code):
+                # The char scanner steps past the end of file after a trailing operator
+                end += 1
+        elif kind == "INTEGER" or kind == "RANGE_INT":
+            self.token = Token(Special.INTEGER, m.group(kind), None, start, lines)
+        elif kind == "NEWLINE":
+            self.token = Token(Special.NEWLINE, None, None, start, lines)
+            lines.add(end, end)
+        elif kind == "BRACKET":
+            self.token = Token(brackets[m.group(kind)], None, None, start, lines)
+        elif kind == "FLOAT":
+            self.token = Token(Special.FLOAT, m.group(kind), None, start, lines)
+        elif kind == "DQ_STR" or kind == "SQ_STR":
+            self.token = Token(Special.STR, m.group(kind), None, start - 1, lines)
+        elif kind == "COMMENT":
+            self.token = Token(Special.COMMENT, m.group(kind), None, start - 1, lines)
+            # The char scanner counts a commented line twice: here and on the NEWLINE token
+            lines.add(end, end + 1)
+        else:
+            self.position = max(self.position + 1, end)
+            self.token = Token(Special.EOF, None, None, self.position, lines)
+            return False
+
+        self.position = end - 1
+        return True
+
+    def next_token_bytes(self) -> bool:
+        source = self.source
+        m = bytes_master_pattern.match(source, self.position + 1)
+        if m is None:
+            return self.next_token_bytes_fallback()
+
+        kind = m.lastgroup
+        start = m.start(kind)
+        end = m.end()
+
+        lines = self.lines
+
+        if kind == "ID":
+            # Keywords are told apart by a bytes lookup, the identifier itself is decoded on demand
+            symbol = bytes_keywords.get(m.group(kind))
+            if symbol is not None:
+                self.token = LazyToken(symbol, source, start, -1, start, lines)
+            else:
+                self.token = LazyToken(Special.ID, source, start, end, start, lines)
+        elif kind == "OP":
+            self.token = LazyToken(bytes_ops[m.group(kind)], source, start, -1, start, lines)
+            if end == len(source):
+                end += 1
+        elif kind == "INTEGER" or kind == "RANGE_INT":
+            self.token = LazyToken(Special.INTEGER, source, start, end, start, lines)
+        elif kind == "NEWLINE":
+            self.token = LazyToken(Special.NEWLINE, source, start, -1, start, lines)
+            lines.add(end, end)
+        elif kind == "BRACKET":
+            self.token = LazyToken(bytes_brackets[m.group(kind)], source, start, -1, start, lines)
+        elif kind == "FLOAT":
+            self.token = LazyToken(Special.FLOAT, source, start, end, start, lines)
+        elif kind == "DQ_STR" or kind == "SQ_STR":
+            self.token = LazyToken(Special.STR, source, start, m.end(kind), start - 1, lines)
+        elif kind == "COMMENT":
+            self.token = LazyToken(Special.COMMENT, source, start, end, start - 1, lines)
+            lines.add(end, end + 1)
+        else:
+            self.position = max(self.position + 1, end)
+            self.token = LazyToken(Special.EOF, source, 0, -1, self.position, lines)
+            return False
+
+        self.position = end - 1
+        return True
+
+    def next_token_bytes_fallback(self) -> bool:
+        source = self.source
+        base = self.lines.start
+        offset = self.position + 1
+
+        # Decode the rest of the line, or the rest of the file if a string literal may start there
+        newline = bytes_newline_pattern.search(source, offset)
+        if newline is None or bytes_quote_pattern.match(source, offset):
+            window = str(source[base:], "utf-8")
+        else:
+            window = str(source[base:newline.end()], "utf-8")
+
+        self.code = window
+        self.position = len(str(source[base:offset], "utf-8")) - 1
+        self.char_pos = self.position + 1
+        self.line = self.lines.line
+        result = self.next_token_by_chars()
+        self.code = str()
+
+        if self.line != self.lines.line:
+            self.add_line_break(base + get_byte_offset(window, self.position - self.char_pos + 1))
+        self.position = base + get_byte_offset(window, self.position + 1) - 1
+        self.token_start = base + get_byte_offset(window, self.token.pos[1] - 1)
+        return result
+
+    def iter_tokens(self, stream, chunk_size: int = 65536):
+        self.setup("")
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        is_exhausted = False
+
+        def read_chunk():
+            nonlocal is_exhausted
+            chunk = stream.read(chunk_size)
+            is_exhausted = not chunk
+            if isinstance(chunk, bytes):
+                chunk = decoder.decode(chunk, final=is_exhausted)
+
+            # Drop the already consumed part of the buffer
+            consumed = self.position + 1
+            self.code = self.code[consumed:] + chunk
+            self.position -= consumed
+            self.lines.rebase(consumed)
+
+        while True:
+            position, line_count = self.position, len(self.lines)
+            try:
+                has_next = self.next_token()
+                # A token is final only if the scanner could see two chars past its end
+                is_complete = is_exhausted or self.position + 3 <= len(self.code)
+            except (LexicalError, IndexError):
+                if is_exhausted:
+                    raise
+                is_complete = False
+
+            if not is_complete:
+                self.position = position
+                self.lines.truncate(line_count)
+                read_chunk()
+                continue
+
+            # The buffer offsets shift with every chunk, so a yielded token keeps its final position
+            self.token.resolve()
+            yield self.token
+            if not has_next:
+                return
+
+    def next_token_fallback(self) -> bool:
+        base = self.lines.start
+        self.char_pos = self.position - base + 1
+        self.line = self.lines.line
+        result = self.next_token_by_chars()
+        if self.line != self.lines.line:
+            self.add_line_break(self.position - self.char_pos + 1)
+        self.token_start = base + self.token.pos[1] - 1
+        return result
+
+    def add_line_break(self, line_start: int):
+        # A comment moves to the next line at its end, a newline right after itself
+        if self.token.symbol == Special.COMMENT:
+            self.lines.add(line_start - 1, line_start)
+        else:
+            self.lines.add(line_start, line_start)
+
+    def next_token_by_chars(self) -> bool:
         code_len = len(self.code)
 
         def char() -> str:
@@ -1,3 +1,6 @@
+from types import GeneratorType
+
+
 def get_args_name_from_count(c):
     cc = c % 10
     if cc == 1:
@@ -26,3 +29,27 @@ def convert_float_to_int(value: float) -> float | int:
         return int(value)
     else:
         return value
+
+
+def trampoline(routine):
+    # Runs a generator that yields the generators it depends on and gets their results back. Nested routines are
+    # kept on an explicit stack instead of the Python one, so their depth is limited only by memory. Yielded values
+    # that are not generators are sent straight back
+    if type(routine) is not GeneratorType:
+        return routine
+    stack = [routine]
+    value = None
+    while True:
+        try:
+            request = stack[-1].send(value)
+        except StopIteration as stop:
+            stack.pop()
+            value = stop.value
+            if not stack:
+                return value
+            continue
+        if type(request) is GeneratorType:
+            stack.append(request)
+            value = None
+        else:
+            value = request
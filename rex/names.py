@@ -0,0 +1,24 @@
+class NameTable:
+    def __init__(self):
+        # Canonical string of every identifier, indexed by its id
+        self.names: list[str] = list()
+        # Id of an identifier given as text or as raw utf-8 bytes
+        self.ids: dict[str | bytes, int] = dict()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name_id: int) -> str:
+        return self.names[name_id]
+
+    def intern(self, name: str | bytes) -> int:
+        name_id = self.ids.get(name)
+        if name_id is None:
+            text = name if isinstance(name, str) else str(name, "utf-8")
+            name_id = self.ids.get(text)
+            if name_id is None:
+                name_id = len(self.names)
+                self.names.append(text)
+                self.ids[text] = name_id
+            self.ids[name] = name_id
+        return name_id
@@ -1,558 +1,845 @@
 import operator
 from rex.symbols import Special
-from rex.misc import try_to_num, convert_float_to_int
-
+from rex.misc import try_to_num, convert_float_to_int, trampoline
 
 def get_indent(indent: int):
-    indent_str = ""
-    for i in range(indent):
-        indent_str += "\t"
-    return indent_str
+    return "\t" * indent
+
+
+def strip_newlines(out: list):
+    # Same as rstrip("\n") of the concatenated parts
+    while out and out[-1].endswith("\n"):
+        out[-1] = out[-1].rstrip("\n")
+        if out[-1]:
+            break
+        out.pop()
+
+
+def written_code(out: list, start: int) -> str | None:
+    # Code written to out since start merged into one part, None if it has too many parts to be a number. Two
+    # parts are a unary operator and a single part: a literal, a name or a folded number, so merges never nest
+    count = len(out) - start
+    if count == 1:
+        return out[start]
+    if count == 2:
+        out[start:] = [out[start] + out[start + 1]]
+        return out[start]
+    return None
 
 
 class Node:
+    # Every node class lists the fields it adds in __slots__, fields holds all of them in the order of declaration
+    __slots__ = ("_types", "_definition", "_defines")
+    fields: tuple[str, ...] = ()
+    # Whether leaves() yields the node itself before the leaves of its children
+    collects_self = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for base in reversed(cls.__mro__):
+            for name in base.__dict__.get("__slots__", ()):
+                if not name.startswith("_") and name not in fields:
+                    fields.append(name)
+        cls.fields = tuple(fields)
+
+    def __init__(self):
+        # Expression type, filled once by the parser
+        self._types = None
+        # Definition read by a variable or function reference
+        self._definition = None
+        # Definition made by an assignment or a function declaration statement
+        self._defines = None
+
     def __repr__(self, level=0):
-        attrs = self.__dict__
+        out = []
+        trampoline(self.describe(out, level))
+        return "".join(out)
+
+    # Writes the tree of the node to out. Children are described by yielding their describe(), nodes at
+    # max_level are written without their fields
+    def describe(self, out: list, level=0, max_level=None):
+        if max_level is not None and level >= max_level:
+            out.append(f"{self.__class__.__name__} ...\n")
+            return
+        attrs = {name: getattr(self, name) for name in self.fields}
         is_sequence = len(attrs) == 1 and isinstance(list(attrs.values())[0], list)
-        res = f"{self.__class__.__name__}\n"
+        out.append(f"{self.__class__.__name__}\n")
         if is_sequence:
             elements = list(attrs.values())[0]
             for el in elements:
-                res += "|\t" * level
-                res += "|+-"
-                res += el.__repr__(level + 1)
-            res += "\n"
+                out.append("|\t" * level)
+                out.append("|+-")
+                if isinstance(el, Node):
+                    yield el.describe(out, level + 1, max_level)
+                else:
+                    out.append(el.__repr__(level + 1))
+            out.append("\n")
         else:
             for attr_name in attrs:
-                res += "|\t" * level
-                res += "|+-"
-                if isinstance(attrs[attr_name], Special):
-                    res += f"{attr_name}: {attrs[attr_name]}"
-                elif isinstance(attrs[attr_name], list):
-                    attr_count = len(attrs[attr_name])
-                    res += f"{attr_name}:"
+                out.append("|\t" * level)
+                out.append("|+-")
+                attr = attrs[attr_name]
+                if isinstance(attr, Special):
+                    out.append(f"{attr_name}: {attr}")
+                elif isinstance(attr, list):
+                    attr_count = len(attr)
+                    out.append(f"{attr_name}:")
                     if attr_count > 0:
-                        res += "\n"
-                        res += "|\t" * level
-                    res += "["
+                        out.append("\n")
+                        out.append("|\t" * level)
+                    out.append("[")
                     if attr_count > 0:
-                        res += "\n"
-                    for el in attrs[attr_name]:
-                        res += "|\t" * (level + 1)
-                        res += (
-                            el.__repr__(level + 1)
-                            if (isinstance(el, Node))
-                            else el.__repr__()
-                        )
-                    res = res.rstrip("\n")
+                        out.append("\n")
+                    for el in attr:
+                        out.append("|\t" * (level + 1))
+                        if isinstance(el, Node):
+                            yield el.describe(out, level + 1, max_level)
+                        else:
+                            out.append(el.__repr__())
+                    strip_newlines(out)
                     if attr_count > 0:
-                        res += "\n"
-                        res += "|\t" * level
-                    res += "]"
+                        out.append("\n")
+                        out.append("|\t" * level)
+                    out.append("]")
                 else:
-                    res += f"{attr_name}: {attrs[attr_name].__repr__(level + 1) if (isinstance(attrs[attr_name], Node)) else attrs[attr_name].__repr__()}"
-                res = res.rstrip("\n") + "\n"
-
-        return res
-
-    def generate(self) -> str:
+                    out.append(f"{attr_name}: ")
+                    if isinstance(attr, Node):
+                        yield attr.describe(out, level + 1, max_level)
+                    else:
+                        out.append(attr.__repr__())
+                strip_newlines(out)
+                out.append("\n")
+
+    def generate(self, *args) -> str:
+        out = []
+        trampoline(self.emit(out, *args))
+        return "".join(out)
+
+    # Writes the code of the node to out. Nodes with children are generators yielding emit() of a child to write
+    # its code, the indent of nested blocks is passed down instead of being added to the code of each line
+    def emit(self, out: list):
         pass
 
     def iterate(self) -> list:
-        return [self]
+        return list(self.leaves())
+
+    # Nodes of the tree in pre-order. The walk keeps an explicit stack and builds no lists of the visited nodes
+    def walk(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            children = node.subnodes()
+            if children is not None:
+                stack.extend(reversed(children))
+
+    # Leaves of the tree in order, nodes marked by collects_self come before the leaves of their children
+    def leaves(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            children = node.subnodes()
+            if children is None:
+                yield node
+                continue
+            if node.collects_self:
+                yield node
+            stack.extend(reversed(children))
+
+    # Children of the node in the walks, None for a leaf
+    def subnodes(self) -> list | None:
+        return None
 
 
 class NodeProgram(Node):
+    __slots__ = ("child",)
+
     def __init__(self, child):
+        super().__init__()
         self.child = child
 
-    def generate(self):
-        code = ""
+    def emit(self, out: list):
         for i in self.child:
-            code += f"{i.generate()}\n"
-        return code
+            yield i.emit(out)
+            out.append("\n")
 
-    def iterate(self) -> list:
-        iterate_result = list()
-        for child in self.child:
-            iterate_result.extend(child.iterate())
-        return iterate_result
+    def subnodes(self):
+        return self.child
 
 
 class NodeBlock(Node):
+    __slots__ = ("indent", "statements")
+
     def __init__(self, statements, indent: int):
+        super().__init__()
         self.indent = indent
         self.statements = statements
 
-    def generate(self, indent=0):
-        code = ""
+    def emit(self, out: list, indent=0):
         indent_str = get_indent(self.indent if indent == 0 else indent)
         if isinstance(self.statements, list):
             for i in self.statements:
-                code += f"{indent_str}{i.generate()}\n"
+                out.append(indent_str)
+                yield i.emit(out)
+                out.append("\n")
         else:
-            code += f"{self.statements.generate(indent)}"
-        return code
+            yield self.statements.emit(out, indent)
 
-    def iterate(self) -> list:
-        iterate_result = list()
-        for stmt in self.statements:
-            iterate_result.extend(stmt.iterate())
-        return iterate_result
+    def subnodes(self):
+        return self.statements if isinstance(self.statements, list) else [self.statements]
 
 
 class NodeNewLine(Node):
-    def generate(self):
-        return ""
+    __slots__ = ()
+
+    def emit(self, out: list):
+        pass
 
 
 # TODO: Не используется, возможно стоит удалить
 class NodeStatement(Node):
+    __slots__ = ("statement",)
+
     def __init__(self, statement):
+        super().__init__()
         self.statement = statement
 
-    def generate(self):
-        return self.statement.generate() + "\n"
+    def emit(self, out: list):
+        yield self.statement.emit(out)
+        out.append("\n")
 
 
 class NodeComment(Node):
+    __slots__ = ("comment",)
+
     def __init__(self, comment):
+        super().__init__()
         self.comment = comment
 
-    def generate(self):
-        return f"#{self.comment}"
+    def emit(self, out: list):
+        out.append(f"#{self.comment}")
 
 
 class NodeLiteral(Node):
+    __slots__ = ("value",)
+
     def __init__(self, value):
+        super().__init__()
         self.value = value
 
-    def generate(self):
-        return str(self.value)
+    def emit(self, out: list):
+        out.append(str(self.value))
 
 
 class NodeInteger(NodeLiteral):
-    pass
+    __slots__ = ()
 
 
 class NodeFloat(NodeLiteral):
-    pass
+    __slots__ = ()
 
 
 class NodeString(NodeLiteral):
-    def generate(self):
-        return f'"{self.value}"'
+    __slots__ = ()
+
+    def emit(self, out: list):
+        out.append(f'"{self.value}"')
 
 
 class NodeNil(Node):
-    def generate(self):
-        return "NULL"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        out.append("NULL")
 
 
 class NodeLogical:
-    pass
+    __slots__ = ()
 
 
 class NodeBool(NodeLiteral, NodeLogical):
-    def generate(self):
-        return str(self.value).upper()
+    __slots__ = ()
+
+    def emit(self, out: list):
+        out.append(str(self.value).upper())
 
 
 class NodeVariable(Node):
-    def __init__(self, id):
+    __slots__ = ("id", "name_id")
+
+    def __init__(self, id, name_id: int):
+        super().__init__()
         self.id = id
+        self.name_id = name_id
 
-    def generate(self):
-        return str(self.id)
+    def emit(self, out: list):
+        out.append(str(self.id))
 
 
 class NodePar(Node):
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
+        super().__init__()
         self.expr = expr
 
-    def generate(self):
-        expr = self.expr.generate()
-        if try_to_num(expr)[0]:
-            return f"{expr}"
-        return f"({expr})"
+    def emit(self, out: list):
+        start = len(out)
+        out.append("(")
+        yield self.expr.emit(out)
+        expr = written_code(out, start + 1)
+        if expr is not None and try_to_num(expr)[0]:
+            out[start:] = [expr]
+        else:
+            out.append(")")
 
-    def iterate(self) -> list:
-        return self.expr.iterate()
+    def subnodes(self):
+        return [self.expr]
 
 
 # region Binary Operators
 class NodeBinOperator(Node):
+    __slots__ = ("left", "right")
+
     def __init__(self, left, right):
+        super().__init__()
         self.left = left
         self.right = right
 
-    def iterate(self) -> list:
-        iterate_result = [item for sublist in [self.left.iterate(), self.right.iterate()] for item in sublist]
-        return iterate_result
+    def operands(self, out: list, op_symbol: str):
+        yield self.left.emit(out)
+        out.append(op_symbol)
+        yield self.right.emit(out)
+
+    def subnodes(self):
+        return [self.left, self.right]
 
 
 class NodeNumericBinOperator(NodeBinOperator):
-    def calc(self, op_symbol: str, op: operator):
-        left = self.left.generate()
-        right = self.right.generate()
+    __slots__ = ()
+
+    def calc(self, out: list, op_symbol: str, op: operator):
+        start = len(out)
+        yield self.left.emit(out)
+        left = written_code(out, start)
+        out.append(f" {op_symbol} ")
+        middle = len(out)
+        yield self.right.emit(out)
+        right = written_code(out, middle)
+        if left is None or right is None:
+            return
         left_num = try_to_num(left)
         right_num = try_to_num(right)
         if left_num[0] and right_num[0]:
-            return f"{convert_float_to_int(op(left_num[1], right_num[1]))}"
-        return f"{left} {op_symbol} {right}"
+            out[start:] = [f"{convert_float_to_int(op(left_num[1], right_num[1]))}"]
 
 
 class NodePlus(NodeNumericBinOperator):
-    def generate(self):
-        return self.calc("+", operator.add)
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.calc(out, "+", operator.add)
 
 
 class NodeMinus(NodeNumericBinOperator):
-    def generate(self):
-        return self.calc("-", operator.sub)
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.calc(out, "-", operator.sub)
 
 
 class NodeAsterisk(NodeNumericBinOperator):
-    def generate(self):
-        return self.calc("*", operator.mul)
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.calc(out, "*", operator.mul)
 
 
 class NodeSlash(NodeNumericBinOperator):
-    def generate(self):
-        return self.calc("/", operator.truediv)
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.calc(out, "/", operator.truediv)
 
 
 class NodeMod(NodeNumericBinOperator):
-    def generate(self):
-        return self.calc("%%", operator.mod)
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.calc(out, "%%", operator.mod)
 
 
 class NodeDegree(NodeNumericBinOperator):
-    def generate(self):
-        return self.calc("^", operator.pow)
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.calc(out, "^", operator.pow)
 
 
 class NodeGreater(NodeBinOperator, NodeLogical):
-    def generate(self):
-        return f"{self.left.generate()} > {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " > ")
 
 
 class NodeGreaterEqual(NodeBinOperator, NodeLogical):
-    def generate(self):
-        return f"{self.left.generate()} >= {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " >= ")
 
 
 class NodeLess(NodeBinOperator, NodeLogical):
-    def generate(self):
-        return f"{self.left.generate()} < {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " < ")
 
 
 class NodeLessEqual(NodeBinOperator, NodeLogical):
-    def generate(self):
-        return f"{self.left.generate()} <= {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " <= ")
 
 
 class NodeCompEqual(NodeBinOperator, NodeLogical):
-    def generate(self):
-        return f"{self.left.generate()} == {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " == ")
 
 
 class NodeNotEqual(NodeBinOperator, NodeLogical):
-    def generate(self):
-        return f"{self.left.generate()} != {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " != ")
 
 
 class NodeAnd(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} & {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " & ")
 
 
 class NodeOr(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} | {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " | ")
 
 
 class NodeDoubleDot(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()}:{self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, ":")
 
 
 class NodeEquals(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} <- {self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.operands(out, " <- ")
+
+
+class NodeAssignOperator(NodeBinOperator):
+    __slots__ = ()
+
+    def assign(self, out: list, op_symbol: str):
+        start = len(out)
+        yield self.left.emit(out)
+        left = out[start:]
+        out.append(" <- ")
+        out.extend(left)
+        out.append(f" {op_symbol} ")
+        yield self.right.emit(out)
+
+
+class NodePlusEquals(NodeAssignOperator):
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.assign(out, "+")
+
 
+class NodeMinusEquals(NodeAssignOperator):
+    __slots__ = ()
 
-class NodePlusEquals(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} <- {self.left.generate()} + {self.right.generate()}"
+    def emit(self, out: list):
+        return self.assign(out, "-")
 
 
-class NodeMinusEquals(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} <- {self.left.generate()} - {self.right.generate()}"
+class NodeAsteriskEquals(NodeAssignOperator):
+    __slots__ = ()
 
+    def emit(self, out: list):
+        return self.assign(out, "*")
 
-class NodeAsteriskEquals(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} <- {self.left.generate()} * {self.right.generate()}"
 
+class NodeSlashEquals(NodeAssignOperator):
+    __slots__ = ()
 
-class NodeSlashEquals(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} <- {self.left.generate()} / {self.right.generate()}"
+    def emit(self, out: list):
+        return self.assign(out, "/")
 
 
-class NodeModEquals(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} <- {self.left.generate()} % {self.right.generate()}"
+class NodeModEquals(NodeAssignOperator):
+    __slots__ = ()
 
+    def emit(self, out: list):
+        return self.assign(out, "%")
 
-class NodeDegreeEquals(NodeBinOperator):
-    def generate(self):
-        return f"{self.left.generate()} <- {self.left.generate()} ** {self.right.generate()}"
+
+class NodeDegreeEquals(NodeAssignOperator):
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.assign(out, "**")
 
 # endregion
 
 
 class NodePrimary(Node):
+    __slots__ = ("value",)
+
     def __init__(self, value):
+        super().__init__()
         self.value = value
 
-    def generate(self):
-        return self.value.generate()
+    def emit(self, out: list):
+        return self.value.emit(out)
 
 
 class NodeIfStatement(Node):
+    __slots__ = ("condition", "block")
+
     def __init__(self, condition, block):
+        super().__init__()
         self.condition = condition
         self.block = block
 
-    def generate(self, indent=0):
-        indent_str = get_indent(indent)
-        return f"if ({self.condition.generate()}) {{\n{self.block.generate(indent + 1)}{indent_str}}}"
+    def emit(self, out: list, indent=0):
+        return self.conditional(out, "if", indent)
 
-    def iterate(self) -> list:
-        result = self.condition.iterate()
-        result.extend(self.block.iterate())
-        return result
+    def conditional(self, out: list, keyword: str, indent: int):
+        out.append(f"{keyword} (")
+        yield self.condition.emit(out)
+        out.append(") {\n")
+        yield self.block.emit(out, indent + 1)
+        out.append(f"{get_indent(indent)}}}")
+
+    def subnodes(self):
+        return [self.condition, self.block]
 
 
 class NodeElsIfStatement(NodeIfStatement):
-    def generate(self, indent=0):
-        indent_str = get_indent(indent)
-        return f"else if ({self.condition.generate()}) {{\n{self.block.generate(indent + 1)}{indent_str}}}"
+    __slots__ = ()
+
+    def emit(self, out: list, indent=0):
+        return self.conditional(out, "else if", indent)
 
 
 class NodeElseStatement(NodeBlock):
-    def generate(self, indent=0):
-        indent_str = get_indent(indent)
-        return f"else {{\n{super().generate(indent + 1)}{indent_str}}}"
+    __slots__ = ()
+
+    def emit(self, out: list, indent=0):
+        out.append("else {\n")
+        yield from super().emit(out, indent + 1)
+        out.append(f"{get_indent(indent)}}}")
 
 
 class NodeIfBlock(Node):
+    __slots__ = ("indent", "if_block", "elsif", "else_block")
+
     def __init__(self, if_block, indent: int, elsif=None, else_block=None):
+        super().__init__()
         self.indent = indent
         self.if_block = if_block
         self.elsif = elsif if elsif is not None else ""
         self.else_block = else_block if else_block is not None else ""
 
-    def generate(self):
-        code = f"{self.if_block.generate(self.indent)}"
+    def emit(self, out: list):
+        yield self.if_block.emit(out, self.indent)
         for elsif in self.elsif:
-            code += f" {elsif.generate(self.indent)}"
+            out.append(" ")
+            yield elsif.emit(out, self.indent)
         if self.else_block != "":
-            code += f" {self.else_block.generate(self.indent)}"
-        return code
+            out.append(" ")
+            yield self.else_block.emit(out, self.indent)
 
-    def iterate(self) -> list:
-        result = self.if_block.iterate()
+    def subnodes(self):
+        children = [self.if_block]
         if self.elsif != "":
-            result.extend(self.elsif.iterate())
+            children.extend(self.elsif)
         if self.else_block != "":
-            result.extend(self.else_block.iterate())
-        return result
+            children.append(self.else_block)
+        return children
 
 
 class NodeCycleStatement(Node):
+    __slots__ = ("indent", "condition", "block")
+
     def __init__(self, condition, block, indent):
+        super().__init__()
         self.indent = indent
         self.condition = condition
         self.block = block
 
-    def iterate(self) -> list:
-        result = self.condition.iterate()
-        result.extend(self.block.iterate())
-        return result
+    def loop(self, out: list, head: str):
+        indent_str = get_indent(self.indent)
+        out.append(head)
+        yield self.condition.emit(out)
+        out.append(f") {indent_str}{{\n")
+        yield self.block.emit(out, self.indent + 1)
+        out.append(f"{indent_str}}}")
+
+    def subnodes(self):
+        return [self.condition, self.block]
 
 
 class NodeWhileBlock(NodeCycleStatement):
-    def generate(self):
-        indent_str = get_indent(self.indent)
-        return f"while ({self.condition.generate()}) {indent_str}{{\n{self.block.generate(self.indent + 1)}{indent_str}}}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.loop(out, "while (")
 
 
 class NodeUntilBlock(NodeCycleStatement):
-    def generate(self):
-        indent_str = get_indent(self.indent)
-        return f"while !({self.condition.generate()}) {indent_str}{{\n{self.block.generate(self.indent + 1)}{indent_str}}}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.loop(out, "while !(")
 
 
 class NodeForBlock(Node):
+    __slots__ = ("indent", "iter", "iterable", "block")
+
     def __init__(self, it, iterable, block, indent):
+        super().__init__()
         self.indent = indent
         self.iter = it
         self.iterable = iterable
         self.block = block
 
-    def generate(self):
-        indent_str = get_indent(self.indent)
-        return f"for ({self.iter.generate()} in {self.iterable.generate()}) {{\n{self.block.generate(self.indent)}{indent_str}}}"
+    def emit(self, out: list):
+        out.append("for (")
+        yield self.iter.emit(out)
+        out.append(" in ")
+        yield self.iterable.emit(out)
+        out.append(") {\n")
+        yield self.block.emit(out, self.indent)
+        out.append(f"{get_indent(self.indent)}}}")
 
-    def iterate(self) -> list:
-        result = self.iterable.iterate()
-        result.extend(self.block.iterate())
-        return result
+    def subnodes(self):
+        return [self.iterable, self.block]
 
 
 class NodeUnaryOp(Node):
+    __slots__ = ("right",)
+
     def __init__(self, right):
+        super().__init__()
         self.right = right
 
-    def iterate(self) -> list:
-        return self.right.iterate()
+    def unary(self, out: list, op_symbol: str):
+        out.append(op_symbol)
+        yield self.right.emit(out)
+
+    def subnodes(self):
+        return [self.right]
 
 
 class NodeUnaryMinus(NodeUnaryOp):
-    def generate(self):
-        return f"-{self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.unary(out, "-")
 
 
 class NodeUnaryPlus(NodeUnaryOp):
-    def generate(self):
-        return f"+{self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.unary(out, "+")
 
 
 class NodeNot(NodeUnaryOp, NodeLogical):
-    def generate(self):
-        return f"!{self.right.generate()}"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        return self.unary(out, "!")
+
+
+def emit_list(out: list, nodes: list):
+    for i, node in enumerate(nodes):
+        if i > 0:
+            out.append(", ")
+        yield node.emit(out)
 
 
 class NodeArgs(Node):
+    __slots__ = ("arguments",)
+
     def __init__(self, arguments):
+        super().__init__()
         self.arguments = arguments
 
-    def generate(self):
-        return f"{', '.join([a.generate() for a in self.arguments])}"
+    def emit(self, out: list):
+        return emit_list(out, self.arguments)
 
-    def iterate(self) -> list:
-        result = []
-        for argument in self.arguments:
-            result.extend(argument.iterate())
-        return result
+    def subnodes(self):
+        return self.arguments
 
 
 class NodeParams(Node):
+    __slots__ = ("params",)
+
     def __init__(self, params):
+        super().__init__()
         self.params = params
 
-    def generate(self):
+    def emit(self, out: list):
         if isinstance(self.params, list):
-            out = [p.generate() for p in self.params]
-            return "" if len(out) == 0 else ", ".join(out)
-        return self.params.generate()
+            return emit_list(out, self.params)
+        return self.params.emit(out)
 
-    def iterate(self) -> list:
-        result = []
-        for param in self.params:
-            result.extend(param.iterate())
-        return result
+    def subnodes(self):
+        return self.params
 
 
 class NodeDeclareParams(NodeParams):
-    pass
+    __slots__ = ()
 
 
 class NodeActualParams(NodeParams):
-    pass
+    __slots__ = ()
 
 
 class NodeFunc(Node):
-    def __init__(self, id, params):
+    __slots__ = ("id", "name_id", "params")
+
+    def __init__(self, id, params, name_id: int):
+        super().__init__()
         self.id = id
+        self.name_id = name_id
         self.params = params
 
 
 class NodeFuncDec(NodeFunc):
-    def __init__(self, id, params, block, indent: int):
-        super().__init__(id, params)
+    __slots__ = ("block", "indent")
+
+    def __init__(self, id, params, block, indent: int, name_id: int):
+        super().__init__(id, params, name_id)
         self.block = block
         self.indent = indent
 
-    def generate(self):
-        indent_str = get_indent(self.indent)
-        return f"{self.id} <- function({self.params.generate()}) {{\n{self.block.generate(self.indent + 1)}{indent_str}}}"
+    def emit(self, out: list):
+        out.append(f"{self.id} <- function(")
+        yield self.params.emit(out)
+        out.append(") {\n")
+        yield self.block.emit(out, self.indent + 1)
+        out.append(f"{get_indent(self.indent)}}}")
 
-    def iterate(self) -> list:
-        return self.block.iterate()
+    def subnodes(self):
+        return [self.block] if self.block is not None else None
 
 
 class NodeFuncCall(NodeFunc):
-    def __init__(self, id, params, predefined_construction=None):
-        super().__init__(id, params)
+    __slots__ = ("predefined_construction",)
+
+    collects_self = True
+
+    def __init__(self, id, params, name_id: int, predefined_construction=None):
+        super().__init__(id, params, name_id)
         self.predefined_construction = predefined_construction
 
-    def generate(self):
-        if self.predefined_construction:
-            return self.predefined_construction.format(name=id, args=self.params.generate())
-        return f"{self.id}({self.params.generate()})"
+    def emit(self, out: list):
+        if not self.predefined_construction:
+            out.append(f"{self.id}(")
+            yield self.params.emit(out)
+            out.append(")")
+            return
+        before, args, after = self.predefined_construction.partition("{args}")
+        out.append(before.format(name=id))
+        if args:
+            yield self.params.emit(out)
+            out.append(after.format(name=id))
 
-    def iterate(self) -> list:
-        return [self] + self.params.iterate()
+    def subnodes(self):
+        return [self.params]
 
 
 class NodeReturn(Node):
+    __slots__ = ("value",)
+
     def __init__(self, value: Node = None):
+        super().__init__()
         self.value: Node = value
 
-    def generate(self):
-        return f"return{' ' + self.value.generate() if self.value is not None else ''}"
+    def emit(self, out: list):
+        if self.value is None:
+            out.append("return")
+            return
+        out.append("return ")
+        yield self.value.emit(out)
 
-    def iterate(self) -> list:
-        return self.value.iterate() if self.value is not None else super().iterate()
+    def subnodes(self):
+        return [self.value] if self.value is not None else None
 
 
 class NodeArray(Node):
+    __slots__ = ("args",)
+
     def __init__(self, args=None):
+        super().__init__()
         self.args = args
 
-    def generate(self):
-        return f"c({str(self.args)})" if self.args is not None else "c()"
+    def emit(self, out: list):
+        out.append("c(")
+        if self.args is not None:
+            yield self.args.emit(out)
+        out.append(")")
 
-    def iterate(self) -> list:
-        return self.args.iterate() if self.args is not None else super().iterate()
+    def subnodes(self):
+        return [self.args] if self.args is not None else None
 
 
 class NodeArrayCall(Node):
-    def __init__(self, id, args: list):
+    __slots__ = ("id", "name_id", "args")
+
+    collects_self = True
+
+    def __init__(self, id, args: list, name_id: int):
+        super().__init__()
         self.id = id
+        self.name_id = name_id
         self.args = args
 
-    def generate(self):
-        args_str = "".join([f"[{a.generate()}]" for a in self.args])
-        return f"{self.id}{args_str}"
-
-    def iterate(self) -> list:
-        result = list()
+    def emit(self, out: list):
+        out.append(str(self.id))
         for a in self.args:
-            result.extend(a.iterate())
-        return result
+            out.append("[")
+            yield a.emit(out)
+            out.append("]")
+
+    def subnodes(self):
+        return self.args
 
 
 class NodeNext(Node):
-    def generate(self):
-        return "next"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        out.append("next")
 
 
 class NodeBreak(Node):
-    def generate(self):
-        return "break"
+    __slots__ = ()
+
+    def emit(self, out: list):
+        out.append("break")
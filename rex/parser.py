@@ -1,8 +1,16 @@
-from rex.lexer import Lexer
+import copy
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from rex.lexer import LexicalError
+from rex.names import NameTable
+from rex.token_buffer import TokenBuffer, TokenCursor
 from rex.types import *
 from rex.nodes import *
 from rex.symbols import *
-from rex.symtable import SymTable
+from rex.symtable import SemanticError, SymTable
+from rex.misc import trampoline
+from rex.grammar_tables import FIRST, FOLLOW, STMT_DISPATCH
 
 bin_ops = {
     Operators.PLUS: NodePlus,
@@ -28,6 +36,35 @@ unary_ops = {
     KeyWords.NOT: NodeNot,
 }
 
+# Binding power of binary operators, all of them are left associative.
+# Unary operators bind tighter than any binary one.
+bin_op_powers = {
+    op: power
+    for power, group in enumerate([
+        [KeyWords.AND, KeyWords.OR],
+        [Operators.DOUBLE_EQUALS, Operators.NOT_EQUALS, Operators.LESS, Operators.GREATER, Operators.LESS_EQUAL,
+         Operators.GREATER_EQUAL],
+        [Operators.PLUS, Operators.MINUS],
+        [Operators.ASTERISK, Operators.SLASH, Operators.MOD, Special.DOUBLE_DOT],
+        [Operators.DEGREE],
+    ], start=1)
+    for op in group
+}
+
+# Tokens starting an operand, met where a binary operator is expected
+operand_tokens = FIRST["arg"] - FIRST["unar_op"]
+
+# Tokens ending the conditions of if and cycle statements, they start <then> and <do> of the grammar
+then_tokens = FIRST["then"]
+do_tokens = FIRST["do"]
+
+# Tokens ending the <arg> of a statement and an element of <args>, they follow <stmt> and <args> in the grammar
+arg_end_tokens = FOLLOW["stmt"]
+args_end_tokens = FOLLOW["args"] | {Special.COMMA}
+
+# Tokens ending the blocks of an if statement, <block> is followed by them everywhere but at the end of <program>
+if_block_end_tokens = FOLLOW["block"] - FOLLOW["program"]
+
 assign_ops = {
     Operators.PLUS_EQUALS: NodePlusEquals,
     Operators.MINUS_EQUALS: NodeMinusEquals,
@@ -48,21 +85,178 @@ class ParsingError(Exception):
     pass
 
 
+# Codes of the tokens delimiting top level function definitions
+FUNCTION_CODE = token_codes[KeyWords.FUNCTION]
+END_CODE = token_codes[KeyWords.END]
+ID_CODE = token_codes[Special.ID]
+LPAR_CODE = token_codes[Special.LPAR]
+RPAR_CODE = token_codes[Special.RPAR]
+COMMA_CODE = token_codes[Special.COMMA]
+NEWLINE_CODE = token_codes[Special.NEWLINE]
+COMMENT_CODE = token_codes[Special.COMMENT]
+EOF_CODE = token_codes[Special.EOF]
+# Keywords opening a block closed by "end"
+block_codes = frozenset(token_codes[k] for k in (KeyWords.FUNCTION, KeyWords.IF, KeyWords.WHILE, KeyWords.UNTIL,
+                                                 KeyWords.FOR))
+
+
+class FunctionBatch:
+    def __init__(self, start: int, end: int, headers: list[tuple[int, int]]):
+        # Token indices of the first "def" and of the last "end"
+        self.start = start
+        self.end = end
+        # Name id and parameter count of every function of the batch
+        self.headers = headers
+
+
+class NodeFunctionChunk(Node):
+    # Stands for a batch of functions parsed by a worker, until the result is merged
+    __slots__ = ("future", "definitions", "functions")
+
+    def __init__(self, future: Future, definitions: list, functions: list):
+        super().__init__()
+        self.future = future
+        self.definitions = definitions
+        self.functions = functions
+
+
+def function_header(buffer: TokenBuffer, index: int) -> tuple[int, int] | None:
+    kinds = buffer.kinds
+    if index + 3 >= len(kinds) or kinds[index + 1] != ID_CODE or kinds[index + 2] != LPAR_CODE:
+        return None
+    args_count = 0
+    i = index + 3
+    while kinds[i] == ID_CODE:
+        args_count += 1
+        i += 1
+        if kinds[i] != COMMA_CODE:
+            break
+        i += 1
+    if kinds[i] != RPAR_CODE:
+        return None
+    return buffer.name_ids[index + 1], args_count
+
+
+def find_function_batches(buffer: TokenBuffer, batch_count: int) -> list[FunctionBatch]:
+    # Runs of top level function definitions separated only by empty lines and comments
+    kinds = buffer.kinds
+    runs = []
+    run = None
+    depth = 0
+    function = None
+    line_start = True
+    for i, kind in enumerate(kinds):
+        if depth == 0 and kind == FUNCTION_CODE and line_start:
+            header = function_header(buffer, i)
+            function = (i, header) if header is not None else None
+            if function is None:
+                run = None
+        elif depth == 0 and kind not in (NEWLINE_CODE, COMMENT_CODE, EOF_CODE):
+            run = None
+        if kind in block_codes:
+            depth += 1
+        elif kind == END_CODE:
+            depth -= 1
+            if depth < 0:
+                return []
+            if depth == 0 and function is not None:
+                if i + 1 < len(kinds) and kinds[i + 1] in (NEWLINE_CODE, EOF_CODE):
+                    if run is None:
+                        run = []
+                        runs.append(run)
+                    run.append((function[0], i, function[1]))
+                else:
+                    run = None
+                function = None
+        line_start = kind == NEWLINE_CODE
+
+    # Split the runs into batches of about the same number of tokens, short runs are left to the sequential parser
+    total = sum(end - start for run in runs for start, end, _ in run)
+    batch_tokens = max(total // max(batch_count, 1), 1)
+    batches = []
+    for run in runs:
+        batch = []
+        size = 0
+        for start, end, header in run:
+            batch.append((start, end, header))
+            size += end - start
+            if size >= batch_tokens:
+                batches.append(FunctionBatch(batch[0][0], batch[-1][1], [h for _, _, h in batch]))
+                batch = []
+                size = 0
+        if batch and size >= batch_tokens // 2:
+            batches.append(FunctionBatch(batch[0][0], batch[-1][1], [h for _, _, h in batch]))
+    return batches
+
+
+def parse_function_batch(text, names: list[str], definitions: list[tuple[bool, int, SemanticType]]):
+    name_table = NameTable()
+    for name in names:
+        name_table.intern(name)
+    parser = Parser()
+    parser.setup(TokenBuffer.tokenize(text, names=name_table))
+    # Global names visible at the start of the batch
+    for is_function, name_id, definition in definitions:
+        if is_function:
+            parser.symtable.add_function(name_id, definition)
+        else:
+            parser.symtable.add_variable(name_id, definition)
+
+    statements = []
+    while parser.token != Special.EOF:
+        statements.append(parser.statement())
+        if parser.token != Special.EOF:
+            parser.require(Special.NEWLINE, Special.SEMICOLON)
+        parser.next_token()
+
+    functions = [stmt._defines for stmt in statements if isinstance(stmt, NodeFuncDec)]
+    return (statements, [d for _, _, d in definitions], functions, parser.removed_statements,
+            parser.removed_symbols)
+
+
+class FunctionBody:
+    # Body of a function skipped by the pre-parse, parsed when the function is referenced
+    def __init__(self, start: int, indent: int, scope: list[tuple[int, Variable | None, Function | None]]):
+        # Token index of the first token of the body
+        self.start = start
+        self.indent = indent
+        # Bindings of the names used in the body at the definition
+        self.scope = scope
+        self.node: NodeFuncDec | None = None
+
+
+def merge_definition(definition: SemanticType, copied: SemanticType):
+    for node in copied.uses:
+        node._definition = definition
+    definition.uses.extend(copied.uses)
+    definition.dropped_uses += copied.dropped_uses
+
+
 class Parser:
-    def __init__(self):
-        self.lexer: Lexer | None = None
+    def __init__(self, lazy_functions: bool = False):
+        self.lexer: TokenCursor | None = None
         self.symtable: SymTable | None = None
         self.indent = 0
         self.token = None
+        # Definitions dropped by the dead code elimination
+        self.removed_statements = 0
+        self.removed_symbols = 0
+        # Top level functions parsed in worker processes, keyed by the token index of their "def"
+        self.function_batches: dict[int, FunctionBatch] = dict()
+        self.executor: ProcessPoolExecutor | None = None
+        # Function bodies are parsed only if the function is referenced
+        self.lazy_functions = lazy_functions
 
     def setup(self, code):
-        self.lexer = Lexer()
-        self.lexer.setup(code)
+        buffer = code if isinstance(code, TokenBuffer) else TokenBuffer.tokenize(code)
+        self.lexer = TokenCursor(buffer)
         self.lexer.next_token()
-        self.symtable = SymTable()
+        self.symtable = SymTable(buffer.names)
         self.symtable.get_pos = lambda: self.lexer.token.pos
         self.indent = 0
         self.token = self.lexer.token.symbol
+        self.removed_statements = 0
+        self.removed_symbols = 0
 
     def next_token(self):
         self.lexer.next_token()
@@ -77,52 +271,52 @@ class Parser:
             self.error(f"Ожидается один из токенов {args}, получен токен {self.token}!")
 
     def is_node_logical(self, node: Node) -> bool:
-        node = get_node_without_par(node)
-        if not issubclass(type(node), NodeLogical):
-            if isinstance(node, NodeFuncCall):
-                rt = self.symtable.get_function(node.id).return_type
-                if rt is not None and issubclass(type(rt), NodeLogical):
-                    return True
+        # Any value can be used as a condition, as in ruby
         return True
 
     def is_string_operand(self, node: Node) -> bool:
-        node = get_node_without_par(node)
-        if issubclass(type(node), NodeBinOperator):
-            return self.is_string_operand(node.left) and self.is_string_operand(node.right)
-        elif not issubclass(type(node), NodeString):
-            if isinstance(node, NodeFuncCall):
-                rt = self.symtable.get_function(node.id).return_type
-                if rt is not None and issubclass(type(rt), NodeString):
-                    return True
-            nt = self.get_node_fundamental_type(node)
-            return nt is StringType or nt is AnyType
-        return True
+        return self.get_node_types(node).string
 
     def is_numeric_operand(self, node: Node) -> bool:
-        node = get_node_without_par(node)
-        if issubclass(type(node), NodeBinOperator):
-            return self.is_numeric_operand(node.left) and self.is_numeric_operand(node.right)
-        elif not issubclass(type(node), NodeInteger) and not issubclass(type(node), NodeFloat):
-            if isinstance(node, NodeFuncCall):
-                rt = self.symtable.get_function(node.id).return_type
-                if rt is not None and (issubclass(type(rt), NodeInteger) or issubclass(type(rt), NodeFloat)):
-                    return True
-            nt = self.get_node_fundamental_type(node)
-            return nt is NumericType or nt is AnyType
-        return True
+        return self.get_node_types(node).numeric
+
+    def get_node_types(self, node: Node) -> ExprType:
+        # Computed once per node, the operands of a binary operator are typed before the operator itself
+        types = node._types
+        if types is None:
+            inner = get_node_without_par(node)
+            if inner is not node:
+                types = self.get_node_types(inner)
+            else:
+                nt = self.get_shallow_fundamental_type(node)
+                if isinstance(node, NodeBinOperator):
+                    left = self.get_node_types(node.left)
+                    right = self.get_node_types(node.right)
+                    types = ExprType(nt, left.string and right.string, left.numeric and right.numeric)
+                else:
+                    types = ExprType(nt, nt is StringType or nt is AnyType, nt is NumericType or nt is AnyType)
+            node._types = types
+        return types
 
     def error(self, msg: str):
-        raise ParsingError(
-            f"({self.lexer.token.pos[0]}, {self.lexer.token.pos[1]}) : {msg}"
-        )
+        line, col = self.lexer.token.pos
+        raise ParsingError(f"({line}, {col}) : {msg}")
 
     def parse(self) -> Node:
         if self.token == Special.EOF:
             self.error("Пустой файл!")
 
+        statements = self.top_level_statements()
+        if self.function_batches:
+            statements = self.merge_function_batches(statements)
+        self.optimize_statements(statements)
+
+        return NodeProgram(statements)
+
+    def top_level_statements(self) -> list:
         statements = []
         while self.token != Special.EOF:
-            statement = self.statement()
+            statement = self.top_level_statement()
 
             if statement:
                 statements.append(statement)
@@ -138,10 +332,83 @@ class Parser:
                 break  # There is no point in parsing further after return
 
             self.next_token()
+        return statements
+
+    def top_level_statement(self) -> Node | None:
+        batch = self.function_batches.get(self.lexer.index)
+        return self.statement() if batch is None else self.submit_function_batch(batch)
+
+    def parse_parallel(self, workers: int = None) -> Node:
+        workers = workers if workers is not None else os.cpu_count()
+        buffer = self.lexer.buffer
+        batches = find_function_batches(buffer, workers * 4) if workers > 1 else []
+        if len(batches) < 2:
+            return self.parse()
+
+        with ProcessPoolExecutor(workers) as executor:
+            self.executor = executor
+            self.function_batches = {batch.start: batch for batch in batches}
+            try:
+                return self.parse()
+            except (ParsingError, SemanticError, LexicalError):
+                pass
+            finally:
+                self.function_batches = dict()
+                self.executor = None
+
+        # Errors are left to the sequential parser, which meets them in source order
+        self.setup(buffer)
+        return self.parse()
+
+    def submit_function_batch(self, batch: FunctionBatch) -> Node:
+        buffer = self.lexer.buffer
+        text = buffer.source[buffer.starts[batch.start]:buffer.ends[batch.end]]
+
+        # Workers get copies of the visible definitions they refer to, the uses they record are merged back
+        # afterwards
+        names = {buffer.name_ids[i] for i in range(batch.start, batch.end + 1) if buffer.kinds[i] == ID_CODE}
+        definitions = []
+        copies = []
+        for is_function, bindings in ((False, self.symtable.variables), (True, self.symtable.functions)):
+            for name_id in names:
+                stack = bindings.get(name_id)
+                if stack is None:
+                    continue
+                definition = copy.copy(stack[-1])
+                definition.uses = list()
+                definition.dropped_uses = 0
+                definitions.append(stack[-1])
+                copies.append((is_function, name_id, definition))
+        future = self.executor.submit(parse_function_batch, text, buffer.names.names, copies)
+
+        functions = []
+        for name_id, args_count in batch.headers:
+            function = Function(args_count=args_count)
+            self.symtable.add_function(name_id, function)
+            functions.append(function)
+
+        self.lexer.seek(batch.end)
+        self.next_token()
+        return NodeFunctionChunk(future, definitions, functions)
 
-        self.optimize_statements(statements)
-
-        return NodeProgram(statements)
+    def merge_function_batches(self, statements: list) -> list:
+        merged = []
+        for stmt in statements:
+            if not isinstance(stmt, NodeFunctionChunk):
+                merged.append(stmt)
+                continue
+            chunk_statements, copies, functions, removed_statements, removed_symbols = stmt.future.result()
+            for definition, copied in zip(stmt.definitions, copies):
+                merge_definition(definition, copied)
+            declarations = [s for s in chunk_statements if isinstance(s, NodeFuncDec)]
+            for function, copied, declaration in zip(stmt.functions, functions, declarations):
+                merge_definition(function, copied)
+                function.return_type = copied.return_type
+                declaration._defines = function
+            merged.extend(chunk_statements)
+            self.removed_statements += removed_statements
+            self.removed_symbols += removed_symbols
+        return merged
 
     def block(self, *args: Enum, skip_last=True, initialize_function=None) -> NodeBlock:
         self.symtable.create_local_namespace()
@@ -154,7 +421,7 @@ class Parser:
 
         statements = []
         while self.token not in args:
-            statement = self.statement()
+            statement = yield self.nested_statement()
 
             if statement:
                 if not is_return_statement_appeared:  # Ignore statements after return statement
@@ -181,103 +448,84 @@ class Parser:
         return NodeBlock(statements, self.indent + 1)
 
     def optimize_statements(self, statements):
-        stmts_to_remove = []
-        name_orders = dict()
-
-        def get_name_order(name):
-            return name_orders.get(name, 0)
-
-        def create_or_increase_name_order(name):
-            if name in name_orders:
-                name_orders[name] += 1
-            else:
-                name_orders[name] = 1
-
-        for stmt in reversed(statements):
-            if isinstance(stmt, NodeEquals):
-                variable = self.symtable.get_variable(stmt.left.id)
-
-                if variable.number_of_uses.get(get_name_order(stmt.left.id)) != 0:
-                    create_or_increase_name_order(stmt.left.id)
-                    continue
-
-                variable.number_of_uses.remove(get_name_order(stmt.left.id))
-                for right_node in stmt.right.iterate():
-                    if self.symtable.get_by_node_type(right_node):
-                        self.symtable.get_by_node_type(right_node).number_of_uses.decrease(get_name_order(right_node.id))
-                stmts_to_remove.append(stmt)
-            elif isinstance(stmt, NodeFuncDec):
-                function = self.symtable.get_function(stmt.id)
-
-                if function.number_of_uses.get(get_name_order(stmt.id)) != 0:
-                    create_or_increase_name_order(stmt.id)
-                    continue
-
-                function.number_of_uses.remove(get_name_order(stmt.id))
-                for child_node in stmt.iterate():
-                    if self.symtable.get_by_node_type(child_node):
-                        self.symtable.get_by_node_type(child_node).number_of_uses.decrease(get_name_order(child_node.id))
-                stmts_to_remove.append(stmt)
-
-        # Apply optimizations for node-tree
-        for stmt in stmts_to_remove:
-            statements.remove(stmt)
-
-        # Trim newlines in beginning and end of block
-        stmts_to_remove.clear()
-        for stmt in statements:
-            if not isinstance(stmt, NodeNewLine):
-                break
-            stmts_to_remove.append(stmt)
-
-        # Apply trim for node-tree
-        for stmt in stmts_to_remove:
-            statements.remove(stmt)
-
-        stmts_to_remove.clear()
-        for stmt in reversed(statements):
-            if not isinstance(stmt, NodeNewLine):
-                break
-            stmts_to_remove.append(stmt)
-
-        # Apply trim for node-tree
-        for stmt in stmts_to_remove:
-            statements.remove(stmt)
+        # Mark dead definitions walking the block backwards, so the uses made by a dead statement are dropped
+        # before the definitions it refers to are checked
+        keep = bytearray(b"\x01") * len(statements)
+        kept_names = set()
+        removed_names = set()
+
+        for i in range(len(statements) - 1, -1, -1):
+            stmt = statements[i]
+            definition = stmt._defines
+            if definition is None:
+                continue
+            name_id = stmt.left.name_id if isinstance(stmt, NodeEquals) else stmt.name_id
+            if definition.is_live():
+                kept_names.add(name_id)
+                continue
+
+            for node in (stmt.right if isinstance(stmt, NodeEquals) else stmt).walk():
+                if node._definition is not None:
+                    node._definition.dropped_uses += 1
+            keep[i] = 0
+            removed_names.add(name_id)
+
+        # Rebuild the block in one sweep, trimming newlines in its beginning and end
+        kept = [stmt for stmt, alive in zip(statements, keep) if alive]
+        start, end = 0, len(kept)
+        while start < end and isinstance(kept[start], NodeNewLine):
+            start += 1
+        while end > start and isinstance(kept[end - 1], NodeNewLine):
+            end -= 1
+        statements[:] = kept[start:end]
+
+        self.removed_statements += len(keep) - sum(keep)
+        self.removed_symbols += len(removed_names.difference(kept_names))
 
     def statement(self) -> Node | None:
+        # Every rule that can contain other rules is parsed by a generator, which yields the generator of a nested
+        # rule to get its node back. Only rules of a single token (variable, literal) are plain methods. The
+        # generators run on an explicit stack, so the nesting depth is not limited by the Python stack
+        return trampoline(self.nested_statement())
+
+    def nested_statement(self):
+        # Alternatives of <stmt> are chosen by the table generated from grammar.ebnf
+        alternative = STMT_DISPATCH.get(self.token)
+        if alternative is not None:
+            return (yield self.stmt_parsers[alternative](self))
         match self.token:
             case Special.NEWLINE:
                 return NodeNewLine()
-            case KeyWords.IF:
-                self.next_token()
-                return self.if_statement()
-            case KeyWords.WHILE | KeyWords.UNTIL | KeyWords.FOR:
-                return self.cycle_statement()
-            case KeyWords.FUNCTION:
-                return self.func_definition()
-            case KeyWords.RETURN:
-                self.next_token()
-                return self.return_statement()
-            case KeyWords.NEXT:
-                self.next_token()
-                return NodeNext()
-            case KeyWords.BREAK:
-                self.next_token()
-                return NodeBreak()
-            case Special.ID:
-                lhs = self.lhs()
-                if self.token == Special.LPAR:  # function call
-                    return self.function_call(lhs.id)
-                if not isinstance(lhs, NodeFuncCall):  # assign operation
-                    return self.assign_op(lhs)
             case Special.COMMENT:
                 comment_text = self.lexer.token.value
                 self.next_token()
                 return NodeComment(comment_text)
         self.error(f"Некорректная конструкция {self.token} {self.lexer.token.pos}!")
 
+    def if_stmt(self) -> Node:
+        self.next_token()
+        return self.if_statement()
+
+    def return_stmt(self) -> Node:
+        self.next_token()
+        return self.return_statement()
+
+    def next_stmt(self) -> Node:
+        self.next_token()
+        return NodeNext()
+
+    def break_stmt(self) -> Node:
+        self.next_token()
+        return NodeBreak()
+
+    def lhs_stmt(self) -> Node:
+        lhs = yield self.lhs()
+        if self.token == Special.LPAR:  # function call
+            return (yield self.function_call(lhs))
+        return (yield self.assign_op(lhs))
+
     def if_statement(self) -> Node:
-        if_block = self.if_block()
+        if_block = yield self.if_block()
         if self.token == KeyWords.END:
             self.next_token()
             return NodeIfBlock(if_block, self.indent)
@@ -286,16 +534,16 @@ class Parser:
             else_block = None
             if self.token == KeyWords.ELSIF:
                 elsif_blocks = []
-                while self.token not in {KeyWords.END, KeyWords.ELSE}:
-                    elsif_blocks.append(self.elseif_block())
+                while self.token not in if_block_end_tokens - {KeyWords.ELSIF}:
+                    elsif_blocks.append((yield self.elseif_block()))
                 if self.token != KeyWords.ELSE:
                     self.next_token()
             if self.token == KeyWords.ELSE:
-                else_block = self.else_block()
+                else_block = yield self.else_block()
             return NodeIfBlock(if_block, self.indent, elsif_blocks, else_block)
 
     def if_block(self) -> Node:
-        condition = self.arg(end=[KeyWords.THEN, Special.NEWLINE, Special.SEMICOLON])
+        condition = yield self.arg(end=then_tokens)
 
         if not self.is_node_logical(condition):
             self.error(f"Ожидалось логическое выражение, а получено {type(condition).__name__}")
@@ -304,22 +552,22 @@ class Parser:
         self.next_token()
         if self.token == Special.NEWLINE:
             self.next_token()
-        block = self.block(KeyWords.END, KeyWords.ELSIF, KeyWords.ELSE, skip_last=False)
+        block = yield self.block(*if_block_end_tokens, skip_last=False)
         return NodeIfStatement(condition, block)
 
     def elseif_block(self) -> Node:
         self.next_token()
-        condition = self.arg(end=[KeyWords.THEN, Special.NEWLINE, Special.SEMICOLON])
+        condition = yield self.arg(end=then_tokens)
         self.require(KeyWords.THEN, Special.NEWLINE, Special.SEMICOLON)
         self.next_token()
-        block = self.block(KeyWords.END, KeyWords.ELSIF, KeyWords.ELSE, skip_last=False)
+        block = yield self.block(*if_block_end_tokens, skip_last=False)
         return NodeElsIfStatement(condition, block)
 
     def else_block(self) -> Node:
         self.next_token()
         self.require(Special.NEWLINE)
         self.next_token()
-        block = self.block(KeyWords.END)
+        block = yield self.block(KeyWords.END)
         return NodeElseStatement(block, self.indent)
 
     def declare_params(self) -> NodeDeclareParams:
@@ -333,7 +581,7 @@ class Parser:
     def actual_params(self) -> NodeActualParams:
         params = []
         while self.token != Special.RPAR:
-            params.append(self.arg(end=[Special.COMMA], pars=True))
+            params.append((yield self.arg(end=[Special.COMMA], pars=True)))
             if self.token == Special.COMMA:
                 self.next_token()
         return NodeActualParams(params)
@@ -346,9 +594,7 @@ class Parser:
                 vars_list = self.variable_list()
                 self.require(KeyWords.IN)
                 self.next_token()
-                iterable = self.arg(
-                    end=[KeyWords.DO, Special.NEWLINE, Special.SEMICOLON]
-                )
+                iterable = yield self.arg(end=do_tokens)
                 self.require(KeyWords.DO, Special.NEWLINE, Special.SEMICOLON)
                 self.next_token()
                 if self.token == Special.NEWLINE:
@@ -356,21 +602,21 @@ class Parser:
 
                 def init_function():
                     for v in vars_list:
-                        self.symtable.add_variable(v.id, Auto())
+                        self.symtable.add_variable(v.name_id, Auto())
 
-                block = self.block(KeyWords.END, initialize_function=init_function)
+                block = yield self.block(KeyWords.END, initialize_function=init_function)
 
                 return NodeForBlock(
                     NodeActualParams(vars_list), iterable, block, self.indent
                 )
             case KeyWords.WHILE | KeyWords.UNTIL:
                 self.next_token()
-                condition = self.arg(end=[KeyWords.DO, Special.NEWLINE, Special.SEMICOLON])
+                condition = yield self.arg(end=do_tokens)
                 self.require(Special.NEWLINE, Special.SEMICOLON, KeyWords.DO)
                 self.next_token()
                 if self.token == Special.NEWLINE:
                     self.next_token()
-                block = self.block(KeyWords.END)
+                block = yield self.block(KeyWords.END)
                 if cycle_token == KeyWords.WHILE:
                     return NodeWhileBlock(condition, block, self.indent)
                 return NodeUntilBlock(condition, block, self.indent)
@@ -381,6 +627,7 @@ class Parser:
 
         self.next_token()
         func_id = self.lexer.token.value
+        func_name_id = self.lexer.token.name_id if self.token == Special.ID else -1
         self.next_token()
         self.require(Special.LPAR, message="Пропущена открывающая скобка!")
         self.next_token()
@@ -390,210 +637,258 @@ class Parser:
         self.require(Special.NEWLINE, Special.SEMICOLON)
         self.next_token()
 
+        if self.lazy_functions:
+            body = self.skip_function_body()
+            if body is not None:
+                function = Function(args_count=len(params.params))
+                function.body = body
+                self.symtable.add_function(func_name_id, function)
+                node = NodeFuncDec(func_id, params, None, self.indent, func_name_id)
+                node._defines = function
+                body.node = node
+                return node
+
+        block = yield self.function_block(params)
+
+        function = Function(args_count=len(params.params), return_type=self.function_return_type(block))
+        self.symtable.add_function(func_name_id, function)
+
+        node = NodeFuncDec(func_id, params, block, self.indent, func_name_id)
+        node._defines = function
+        return node
+
+    def function_block(self, params: NodeDeclareParams):
         def init_function():
             for p in params.params:
-                self.symtable.add_variable(p.id, Auto())
+                self.symtable.add_variable(p.name_id, Auto())
 
-        block = self.block(KeyWords.END, initialize_function=init_function)
+        return (yield self.block(KeyWords.END, initialize_function=init_function))
 
-        return_type = None
+    def function_return_type(self, block: NodeBlock):
         for stmt in block.statements:
             if isinstance(stmt, NodeReturn):
                 rt = stmt.value
                 while isinstance(rt, NodeFuncCall):
-                    rt = self.symtable.get_function(rt.id).return_type
-                return_type = rt
-                break
-
-        self.symtable.add_function(
-            func_id,
-            Function(args_count=len(params.params), return_type=return_type),
-        )
-
-        return NodeFuncDec(func_id, params, block, self.indent)
-
-    def function_call(self, func_name):
+                    rt = self.symtable.get_function(rt.name_id).return_type
+                return rt
+        return None
+
+    def skip_function_body(self) -> FunctionBody | None:
+        # Pre-parse: the body is matched with its "end" by the tokens only. Bindings of the names it mentions
+        # are kept, so that it is parsed later as if it was parsed here
+        buffer = self.lexer.buffer
+        kinds = buffer.kinds
+        start = self.lexer.index
+        depth = 1
+        end = start
+        while depth > 0:
+            kind = kinds[end]
+            if kind in block_codes:
+                depth += 1
+            elif kind == END_CODE:
+                depth -= 1
+            elif kind == EOF_CODE:
+                return None  # Left to the full parse, which reports the error
+            end += 1
+        end -= 1
+
+        variables, functions = self.symtable.variables, self.symtable.functions
+        scope = []
+        for name_id in {buffer.name_ids[i] for i in range(start, end) if kinds[i] == ID_CODE}:
+            variable, function = variables.get(name_id), functions.get(name_id)
+            scope.append((name_id, variable[-1] if variable else None, function[-1] if function else None))
+
+        self.lexer.seek(end)
         self.next_token()
-        call_args = self.args(end=[Special.COMMA, Special.NEWLINE], pars=True)
+        return FunctionBody(start, self.indent, scope)
+
+    def function_body(self, function: Function):
+        # Parses the body of a function skipped by the pre-parse, at its first reference
+        body, function.body = function.body, None
+        index, indent = self.lexer.index, self.indent
+        variables, functions = self.symtable.variables, self.symtable.functions
+        visible = []
+        for name_id, variable, defined_function in body.scope:
+            visible.append((name_id, variables.pop(name_id, None), functions.pop(name_id, None)))
+            if variable is not None:
+                variables[name_id] = [variable]
+            if defined_function is not None:
+                functions[name_id] = [defined_function]
+
+        self.lexer.seek(body.start)
+        self.token = self.lexer.symbol
+        self.indent = body.indent
+        block = yield self.function_block(body.node.params)
+
+        for name_id, variable, defined_function in visible:
+            variables.pop(name_id, None)
+            functions.pop(name_id, None)
+            if variable is not None:
+                variables[name_id] = variable
+            if defined_function is not None:
+                functions[name_id] = defined_function
+        self.lexer.seek(index)
+        self.token = self.lexer.symbol
+        self.indent = indent
+
+        body.node.block = block
+        function.return_type = self.function_return_type(block)
+
+    def function_call(self, func):
+        self.next_token()
+        call_args = yield self.args(end=args_end_tokens, pars=True)
         self.require(Special.RPAR, message="Пропущена закрывающая скобка!")
         self.next_token()
 
-        self.symtable.check_function_arguments_count(func_name, len(call_args.arguments))
+        self.symtable.check_function_arguments_count(func.name_id, len(call_args.arguments))
 
-        f = self.symtable.get_function(func_name)
-        f.number_of_uses.increase()
+        f = self.symtable.get_function(func.name_id)
+        if f.body is not None:
+            yield self.function_body(f)
 
         if isinstance(f, PredefinedFunction):
-            return NodeFuncCall(func_name, call_args, f.predefined_construction)
-
-        return NodeFuncCall(func_name, call_args)
+            node = NodeFuncCall(func.id, call_args, func.name_id, f.predefined_construction)
+        else:
+            node = NodeFuncCall(func.id, call_args, func.name_id)
+        f.add_use(node)
+        return node
 
     def return_statement(self) -> Node:
-        if self.token in [Special.NEWLINE, Special.SEMICOLON]:
+        if self.token in FIRST["new_line"]:
             return NodeReturn()
-        args = self.args()
+        args = yield self.args()
         return NodeReturn(args.arguments[0] if len(args.arguments) == 1 else args)
 
     def arg(self, end=None, pars=False):
         if end is None:
-            end = [Special.NEWLINE, Special.EOF]
-
-        def get_op_priority(op) -> int:
-            match op:
-                case Special.LPAR:
-                    return 0
-                case KeyWords.AND | KeyWords.OR:
-                    return 1
-                case Operators.DOUBLE_EQUALS | Operators.NOT_EQUALS | Operators.LESS | Operators.GREATER | Operators.LESS_EQUAL | Operators.GREATER_EQUAL:
-                    return 2
-                case Operators.PLUS | Operators.MINUS:
-                    return 3
-                case Operators.ASTERISK | Operators.SLASH | Operators.MOD | Special.DOUBLE_DOT:
-                    return 4
-                case Operators.DEGREE:
-                    return 5
-                case _:
-                    if isinstance(op, type) and issubclass(op, NodeUnaryOp):
-                        return 5
-            self.error(f"Некорректный элемент математического выражения {op}")
-
-        def apply_stack_op():
-            top_of_temp_stack = temp_stack.pop()
-
-            if isinstance(top_of_temp_stack, type) and issubclass(top_of_temp_stack, NodeUnaryOp):
-                top_of_out_stack = out_stack.pop()
-                if type(top_of_out_stack) is top_of_temp_stack:
-                    out_stack.append(top_of_out_stack.right)
-                else:
-                    out_stack.append(top_of_temp_stack(top_of_out_stack))
-            elif top_of_temp_stack in bin_ops:
-                right_operand = out_stack.pop()
-                left_operand = out_stack.pop()
-
-                if top_of_temp_stack in [KeyWords.AND, KeyWords.OR]:
-                    if not self.is_node_logical(left_operand):
-                        self.error(
-                            f"Ожидалось логическое значение, а получено "
-                            f"{get_node_without_par(left_operand).__class__.__name__}"
-                        )
-                    if not self.is_node_logical(right_operand):
-                        self.error(
-                            f"Ожидалось логическое значение, а получено "
-                            f"{get_node_without_par(right_operand).__class__.__name__}"
-                        )
-                if top_of_temp_stack in {Operators.PLUS}:
-                    is_left_string = self.is_string_operand(left_operand)
-                    is_left_numeric = self.is_numeric_operand(left_operand)
-                    is_right_string = self.is_string_operand(right_operand)
-                    is_right_numeric = self.is_numeric_operand(right_operand)
-
-                    if is_left_string and not is_right_string:
-                        self.error(f"Ожидалось строковое значение, а получено "
-                                   f"{get_node_without_par(right_operand).__class__.__name__}")
-                    elif is_left_numeric and not is_right_numeric:
-                        self.error(f"Ожидалось численное значение, а получено "
-                                   f"{get_node_without_par(right_operand).__class__.__name__}")
-
-                if top_of_temp_stack in {Operators.MINUS, Operators.MOD, Operators.ASTERISK, Operators.DEGREE, Operators.SLASH}:
-                    numeric_flag = self.is_numeric_operand(left_operand) and self.is_numeric_operand(right_operand)
-                    if not numeric_flag:
-                        self.error(f"Ожидалось численное значение, а получено "
-                                   f"{get_node_without_par(right_operand).__class__.__name__}")
-
-
-                out_stack.append(bin_ops[top_of_temp_stack](left_operand, right_operand))
-            elif top_of_temp_stack == Special.LPAR:
-                self.error("Пропущена закрывающая скобка!")
-            else:
-                out_stack.append(top_of_temp_stack)
-
-        temp_stack = []
-        out_stack: list[Node] = []
-        left_par_count = 0
-        last_parsed_is_op = True
-
-        while self.token not in end:
-            if self.token not in bin_ops and self.token not in unary_ops:
-                last_parsed_is_op = False
-                if self.token == Special.LPAR:
-                    left_par_count += 1
-                    temp_stack.append(self.token)
-                    self.next_token()
-                    last_parsed_is_op = True
-                elif self.token == Special.RPAR:
-                    if left_par_count == 0 and pars:
-                        break
-                    while temp_stack[-1] != Special.LPAR:
-                        apply_stack_op()
-                        if len(temp_stack) == 0:
-                            self.error("Пропущена открывающая скобка!")
-                    temp_stack.pop()
-                    left_par_count -= 1
-                    if (
-                            not isinstance(out_stack[-1], NodeLiteral)
-                            and not isinstance(out_stack[-1], NodeVariable)
-                            and not isinstance(out_stack[-1], NodeFuncCall)
-                            and not isinstance(out_stack[-1], NodePar)
-                    ):
-                        out_stack.append(NodePar(out_stack.pop()))
-                    self.next_token()
-                else:
-                    out_stack.append(self.primary())
-            else:
-                if last_parsed_is_op:
-                    if self.token not in unary_ops:
-                        self.error(f"Неожиданный унарный оператор {self.token}")
-                    temp_stack.append(unary_ops[self.token])
-                else:
-                    last_parsed_is_op = True
-                    opp = get_op_priority(self.token)
-                    while (
-                            len(temp_stack) > 0 and get_op_priority(temp_stack[-1]) >= opp
-                    ):
-                        apply_stack_op()
-                    temp_stack.append(self.token)
-                self.next_token()
+            end = arg_end_tokens
 
-        while len(temp_stack) > 0:
-            apply_stack_op()
+        if self.token in end or self.token == Special.RPAR and pars:
+            return None
 
-        arg = out_stack.pop() if len(out_stack) else None
+        arg = yield self.expression(end, 0)
+        if self.token == Special.RPAR and not pars:
+            self.error("Пропущена открывающая скобка!")
 
         while isinstance(arg, NodePar):
             arg = arg.expr
 
         return arg
 
+    def expression(self, end, min_power: int) -> Node:
+        # Prefix: unary operators, then a parenthesised expression or a primary
+        unary_nodes = []
+        while self.token in unary_ops and self.token not in end:
+            unary_nodes.append(unary_ops[self.token])
+            self.next_token()
+
+        if self.token in bin_ops and self.token not in end:
+            self.error(f"Неожиданный унарный оператор {self.token}")
+
+        if self.token == Special.LPAR and self.token not in end:
+            self.next_token()
+            if self.token in end:
+                self.error("Пропущена закрывающая скобка!")
+            left = yield self.expression(end, 0)
+            if self.token != Special.RPAR:
+                self.error("Пропущена закрывающая скобка!")
+            self.next_token()
+            if not isinstance(left, (NodeLiteral, NodeVariable, NodeFuncCall, NodePar)):
+                left = NodePar(left)
+        else:
+            left = yield self.primary()
+
+        for unary_node in reversed(unary_nodes):
+            left = left.right if type(left) is unary_node else unary_node(left)
+
+        # Infix: binary operators binding tighter than the enclosing one
+        while self.token not in end and self.token != Special.RPAR:
+            op = self.token
+            power = bin_op_powers.get(op)
+            if power is None:
+                if op in unary_ops:
+                    self.error(f"Некорректный элемент математического выражения {op}")
+                if op in operand_tokens:
+                    self.error(f"Был получен токен {op}, а ожидался бинарный оператор!")
+                self.error(f"Был получен токен {op}, а ожидался литерал или функция!")
+            if power <= min_power:
+                break
+            self.next_token()
+            right = yield self.expression(end, power)
+            left = self.bin_op_node(op, left, right)
+
+        return left
+
+    def bin_op_node(self, op, left_operand: Node, right_operand: Node) -> Node:
+        if op in [KeyWords.AND, KeyWords.OR]:
+            if not self.is_node_logical(left_operand):
+                self.error(
+                    f"Ожидалось логическое значение, а получено "
+                    f"{get_node_without_par(left_operand).__class__.__name__}"
+                )
+            if not self.is_node_logical(right_operand):
+                self.error(
+                    f"Ожидалось логическое значение, а получено "
+                    f"{get_node_without_par(right_operand).__class__.__name__}"
+                )
+        if op in {Operators.PLUS}:
+            is_left_string = self.is_string_operand(left_operand)
+            is_left_numeric = self.is_numeric_operand(left_operand)
+            is_right_string = self.is_string_operand(right_operand)
+            is_right_numeric = self.is_numeric_operand(right_operand)
+
+            if is_left_string and not is_right_string:
+                self.error(f"Ожидалось строковое значение, а получено "
+                           f"{get_node_without_par(right_operand).__class__.__name__}")
+            elif is_left_numeric and not is_right_numeric:
+                self.error(f"Ожидалось численное значение, а получено "
+                           f"{get_node_without_par(right_operand).__class__.__name__}")
+
+        if op in {Operators.MINUS, Operators.MOD, Operators.ASTERISK, Operators.DEGREE, Operators.SLASH}:
+            numeric_flag = self.is_numeric_operand(left_operand) and self.is_numeric_operand(right_operand)
+            if not numeric_flag:
+                self.error(f"Ожидалось численное значение, а получено "
+                           f"{get_node_without_par(right_operand).__class__.__name__}")
+
+        node = bin_ops[op](left_operand, right_operand)
+        self.get_node_types(node)
+        return node
+
     def args(self, end=None, pars=False):
         if end is None:
-            end = [Special.COMMA, Special.NEWLINE]
+            end = args_end_tokens
         args = list()
-        first_arg = self.arg(end=end, pars=pars)
+        first_arg = yield self.arg(end=end, pars=pars)
         if first_arg:
             args.append(first_arg)
             while self.token == Special.COMMA:
                 self.next_token()
-                args.append(self.arg(end=end, pars=pars))
+                args.append((yield self.arg(end=end, pars=pars)))
         return NodeArgs(args)
 
     def assign_op(self, lhs):
         if self.token == Operators.EQUALS:
             self.next_token()
-            value = self.arg()
+            value = yield self.arg()
+            if value is None:
+                self.error(f"Был получен токен {self.token}, а ожидался литерал или функция!")
 
             if isinstance(value, NodeArray):
-                self.symtable.add_variable(lhs.id, Array())
+                variable = Array()
             else:
-                self.symtable.add_variable(lhs.id, Variable(self.get_node_fundamental_type(value)))
-            return NodeEquals(lhs, value)
+                variable = Variable(self.get_node_fundamental_type(value))
+            self.symtable.add_variable(lhs.name_id, variable)
+            node = NodeEquals(lhs, value)
+            node._defines = variable
+            return node
 
         if self.token not in assign_ops:
             self.error(f"Неизвестный оператор присваивания {self.token}!")
 
-        self.symtable.check_variable_presence(lhs.id)
+        self.symtable.check_variable_presence(lhs.name_id)
         assign_op = assign_ops[self.token]
         self.next_token()
-        return assign_op(lhs, self.arg())
+        return assign_op(lhs, (yield self.arg()))
 
     def bin_op(self, first):
         bin_operator: dict = {
@@ -614,15 +909,15 @@ class Parser:
         if self.token not in bin_operator:
             self.error(f"Был получен токен {self.token}, а ожидался бинарный оператор!")
 
-        node = bin_operator[self.token](first, self.arg())
+        node = bin_operator[self.token](first, (yield self.arg()))
         self.next_token()
         return node
 
-    def primary(self) -> Node:
+    def primary(self):
         match self.token:
             # <literal> | <lhs> | <func_call> | "LBR" [args] "RBR"
             case Special.ID:
-                return self.rhs()
+                return (yield self.rhs())
             case Special.INTEGER | Special.FLOAT | Special.STR | Reserved.TRUE | Reserved.FALSE | Reserved.NIL:
                 return self.literal()
             case Special.LBR:
@@ -630,7 +925,7 @@ class Parser:
                 if self.token == Special.RBR:
                     self.next_token()
                     return NodeArray()
-                args = self.args()
+                args = yield self.args()
                 self.require(Special.RBR)
                 self.next_token()
                 return NodeArray(args)
@@ -642,8 +937,9 @@ class Parser:
     def variable(self):
         self.require(Special.ID, message="Ожидалась переменная!")
         name = self.lexer.token.value
+        name_id = self.lexer.token.name_id
         self.next_token()
-        return NodeVariable(name)
+        return NodeVariable(name, name_id)
 
     def variable_list(self):
         var_list = [self.variable()]
@@ -658,24 +954,24 @@ class Parser:
             args = []
             while self.token == Special.LBR:
                 self.next_token()
-                idx = self.arg(end=[Special.RBR, Special.COMMA])
+                idx = yield self.arg(end=[Special.RBR, Special.COMMA])
                 if isinstance(idx, NodeFloat):
                     self.error("Индексами массива могут быть только целые числа!")
                 args.append(idx)
                 self.require(Special.RBR)
                 self.next_token()
-            self.symtable.check_variable_is_array(var.id)
-            return NodeArrayCall(var.id, args)
+            self.symtable.check_variable_is_array(var.name_id)
+            return NodeArrayCall(var.id, args, var.name_id)
         return var
 
     def rhs(self):
-        lhs = self.lhs()
+        lhs = yield self.lhs()
 
         if isinstance(lhs, NodeVariable) and self.token == Special.LPAR:
-            return self.function_call(lhs.id)
+            return (yield self.function_call(lhs))
 
-        self.symtable.check_variable_presence(lhs.id)
-        self.symtable.get_variable(lhs.id).number_of_uses.increase()
+        self.symtable.check_variable_presence(lhs.name_id)
+        self.symtable.get_variable(lhs.name_id).add_use(lhs)
         return lhs
 
     def literal(self):
@@ -695,7 +991,9 @@ class Parser:
         return node
 
     def get_node_fundamental_type(self, node: Node) -> type:
-        node = get_node_without_par(node)
+        return self.get_node_types(node).fundamental
+
+    def get_shallow_fundamental_type(self, node: Node) -> type:
         if isinstance(node, (NodeInteger, NodeFloat, NodeUnaryPlus, NodeUnaryMinus, NodePlus, NodeMinus, NodeAsterisk, NodeSlash, NodeDegree, NodeMod)):
             return NumericType
         if isinstance(node, NodeString):
@@ -703,6 +1001,16 @@ class Parser:
         if isinstance(node, NodeArrayCall):
             return ArrayType
         if isinstance(node, NodeVariable):
-            return self.symtable.get_variable(node.id).type
+            return self.symtable.get_variable(node.name_id).type
         return AnyType
 
+    # Parsers of the <stmt> alternatives, keyed by the names used in the dispatch table
+    stmt_parsers = {
+        "if_stmt": if_stmt,
+        "cycle_stmt": cycle_statement,
+        "func_def": func_definition,
+        "RETURN": return_stmt,
+        "NEXT": next_stmt,
+        "BREAK": break_stmt,
+        "lhs": lhs_stmt,
+    }
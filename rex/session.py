@@ -0,0 +1,73 @@
+from rex.names import NameTable
+from rex.nodes import NodeProgram
+from rex.parser import Parser, ID_CODE
+from rex.symtable import SymTable
+from rex.token_buffer import TokenBuffer, TokenCursor
+
+
+class Session(Parser):
+    # Translates a program submitted piece by piece, as in a REPL. Every input is parsed against the definitions
+    # left by the previous ones, so its cost does not depend on the size of the session. Later inputs may use any
+    # earlier definition, so the dead code elimination of the top level runs only on flush()
+    def __init__(self):
+        super().__init__()
+        self.names = NameTable()
+        self.symtable = SymTable(self.names)
+        self.symtable.get_pos = lambda: self.lexer.token.pos
+        # Top level statements submitted since the last flush
+        self.statements: list = list()
+
+    def submit(self, code) -> str:
+        # Code of the input, the input is either accepted as a whole or rejected leaving the session unchanged
+        buffer = TokenBuffer.tokenize(code, names=self.names)
+        names = {buffer.name_ids[i] for i in range(len(buffer)) if buffer.kinds[i] == ID_CODE}
+        saved = self.save_bindings(names)
+        removed_statements, removed_symbols = self.removed_statements, self.removed_symbols
+
+        self.lexer = TokenCursor(buffer)
+        try:
+            self.next_token()
+            statements = self.top_level_statements()
+            code = NodeProgram(statements).generate()
+        except Exception:
+            self.restore_bindings(saved)
+            self.indent = 0
+            self.removed_statements, self.removed_symbols = removed_statements, removed_symbols
+            raise
+
+        self.statements.extend(statements)
+        return code
+
+    def flush(self) -> str:
+        # Code of the statements submitted since the last flush without the dead ones. The definitions stay
+        # visible to the next inputs
+        statements, self.statements = self.statements, list()
+        self.optimize_statements(statements)
+        return NodeProgram(statements).generate()
+
+    def save_bindings(self, names: set) -> list:
+        # Between inputs only the global name space exists, so a name has at most one binding of each kind
+        global_space = self.symtable.name_spaces[0]
+        saved = []
+        for name_id in names:
+            for bindings, space in ((self.symtable.variables, global_space.variables),
+                                    (self.symtable.functions, global_space.functions)):
+                definition = space.get(name_id)
+                if definition is None:
+                    saved.append((bindings, space, name_id, None, 0, 0))
+                else:
+                    saved.append((bindings, space, name_id, definition, len(definition.uses), definition.dropped_uses))
+        return saved
+
+    def restore_bindings(self, saved: list):
+        while len(self.symtable.name_spaces) > 1:
+            self.symtable.dispose_local_namespace()
+        for bindings, space, name_id, definition, uses, dropped_uses in saved:
+            if definition is None:
+                bindings.pop(name_id, None)
+                space.pop(name_id, None)
+                continue
+            bindings[name_id] = [definition]
+            space[name_id] = definition
+            del definition.uses[uses:]
+            definition.dropped_uses = dropped_uses
@@ -0,0 +1,29 @@
+import sys
+
+from rex.nodes import Node
+
+
+def ast_memory(tree: Node) -> dict[str, int]:
+    # Bytes taken by the nodes of every type, with their instance dicts and the lists held in their fields.
+    # Shared nodes are counted once, values that are not nodes (names, literal strings) are not counted
+    sizes: dict[str, int] = dict()
+    seen = {id(tree)}
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        size = sys.getsizeof(node)
+        if hasattr(node, "__dict__"):
+            size += sys.getsizeof(node.__dict__)
+        for name in node.fields:
+            value = getattr(node, name)
+            children = (value,)
+            if isinstance(value, list):
+                size += sys.getsizeof(value)
+                children = value
+            for child in children:
+                if isinstance(child, Node) and id(child) not in seen:
+                    seen.add(id(child))
+                    stack.append(child)
+        name = type(node).__name__
+        sizes[name] = sizes.get(name, 0) + size
+    return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
@@ -161,3 +161,7 @@ keywords: dict[str, KeyWords] = {
     'false': Reserved.FALSE,
     'nil': Reserved.NIL
 }
+
+# Dense codes of all token symbols, used by the compact token buffer
+token_kinds: list[Enum] = [*KeyWords, *Special, *Reserved, *Operators]
+token_codes: dict[Enum, int] = {symbol: code for code, symbol in enumerate(token_kinds)}
@@ -0,0 +1,535 @@
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from rex.lexer import (
+    Lexer, LexicalError, LineIndex, Token, map_file,
+    master_pattern, bytes_master_pattern, bytes_ops, bytes_brackets, bytes_keywords
+)
+from rex.names import NameTable
+from rex.symbols import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ID_CODE = token_codes[Special.ID]
+INTEGER_CODE = token_codes[Special.INTEGER]
+FLOAT_CODE = token_codes[Special.FLOAT]
+STR_CODE = token_codes[Special.STR]
+COMMENT_CODE = token_codes[Special.COMMENT]
+NEWLINE_CODE = token_codes[Special.NEWLINE]
+EOF_CODE = token_codes[Special.EOF]
+
+# Byte classes of the NumPy pre-pass
+BLANK_CLASS, NEWLINE_CLASS, ALPHA_CLASS, DIGIT_CLASS, UNDERSCORE_CLASS, QUESTION_CLASS = range(6)
+OP_CHAR_CLASS, BRACKET_CLASS, QUOTE_CLASS, HASH_CLASS, LITERAL_CLASS, OTHER_CLASS = range(6, 12)
+NEWLINE_BYTE, HASH_BYTE, ZERO_BYTE = ord("\n"), ord("#"), ord("0")
+QUOTE_BYTES = b"\"'"
+
+
+def build_byte_tables():
+    char_classes = np.full(256, OTHER_CLASS, np.uint8)
+    single_char_codes = np.zeros(256, np.uint8)
+    plain_number_end = np.zeros(256, bool)
+    for c in range(128):
+        char = chr(c)
+        if char in " \t\r\x0b\x0c":
+            char_classes[c] = BLANK_CLASS
+        elif char == "\n":
+            char_classes[c] = NEWLINE_CLASS
+        elif char.isalpha():
+            char_classes[c] = ALPHA_CLASS
+        elif char.isdigit():
+            char_classes[c] = DIGIT_CLASS
+        elif char == "_":
+            char_classes[c] = UNDERSCORE_CLASS
+        elif char == "?":
+            char_classes[c] = QUESTION_CLASS
+        elif any(char in op for op in ops):
+            char_classes[c] = OP_CHAR_CLASS
+        elif char in brackets:
+            char_classes[c] = BRACKET_CLASS
+        elif char in "\"'":
+            char_classes[c] = QUOTE_CLASS
+        elif char == "#":
+            char_classes[c] = HASH_CLASS
+
+        if char in ops:
+            single_char_codes[c] = token_codes[ops[char]]
+        elif char in brackets:
+            single_char_codes[c] = token_codes[brackets[char]]
+        # A dot after an integer may start a float or a range, those go to the master pattern
+        plain_number_end[c] = char.isspace() or char in ops and char != "." or char in ")]"
+
+    op_codes = np.zeros(256, bool)
+    op_codes[[token_codes[symbol] for symbol in ops.values()]] = True
+    word_classes = np.array([ALPHA_CLASS, DIGIT_CLASS, UNDERSCORE_CLASS, QUESTION_CLASS], np.uint8)
+    return char_classes, single_char_codes, plain_number_end, op_codes, word_classes
+
+
+if np is not None:
+    char_classes, single_char_codes, plain_number_end, op_codes, word_classes = build_byte_tables()
+
+
+def find_runs(mask) -> tuple:
+    edges = np.diff(np.concatenate(([False], mask, [False])).astype(np.int8))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def span_mask(starts, ends, size: int):
+    marks = np.zeros(size + 1, np.int32)
+    marks[starts] += 1
+    marks[ends] -= 1
+    return np.cumsum(marks[:-1]) > 0
+
+
+class TokenBuffer:
+    def __init__(self, source, names: NameTable = None):
+        self.source = source
+        self.is_bytes = not isinstance(source, str)
+        offset_type = "I" if len(source) < 2 ** 32 - 2 else "Q"
+
+        # Token columns: kind code, start and end offsets
+        self.kinds = array("B")
+        self.starts = array(offset_type)
+        self.ends = array(offset_type)
+        # Interned id of every identifier token, 0 for other tokens
+        self.name_ids = array("I")
+        self.names = names if names is not None else NameTable()
+        # Line breaks of the source, line and column of a token are looked up only on demand
+        self.lines = LineIndex(source if self.is_bytes else None)
+        # Lexing error met after the last token, raised when a cursor reaches it
+        self.error: Exception | None = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index: int) -> Token:
+        return Token(self.symbol(index), self.value(index), self.pos(index))
+
+    def symbol(self, index: int) -> Enum:
+        return token_kinds[self.kinds[index]]
+
+    def value(self, index: int) -> str | None:
+        kind = self.kinds[index]
+        if kind == ID_CODE:
+            return self.names[self.name_ids[index]]
+        elif kind == INTEGER_CODE or kind == FLOAT_CODE:
+            start, end = self.starts[index], self.ends[index]
+        elif kind == STR_CODE:
+            start, end = self.starts[index] + 1, self.ends[index] - 1
+        elif kind == COMMENT_CODE:
+            start, end = self.starts[index] + 1, self.ends[index]
+        else:
+            return None
+        if self.is_bytes:
+            return str(self.source[start:end], "utf-8")
+        return self.source[start:end]
+
+    def pos(self, index: int, overrun: int = 0) -> tuple[int, int]:
+        return self.lines.pos(self.starts[index] + overrun)
+
+    def bytes_per_token(self) -> float:
+        if len(self.kinds) == 0:
+            return 0.0
+        columns = [self.kinds, self.starts, self.ends, self.name_ids, self.lines.breaks, self.lines.starts]
+        return sum(len(c) * c.itemsize for c in columns) / len(self.kinds)
+
+    @staticmethod
+    def tokenize(code, use_numpy: bool = True, names: NameTable = None) -> "TokenBuffer":
+        buffer = TokenBuffer(code, names)
+        if not use_numpy or np is None or not buffer.scan_vectorized():
+            buffer.scan(-1)
+        return buffer
+
+    def relex(self, code, start: int, end: int, new_end: int) -> "TokenBuffer":
+        # Tokens of the edited code, where code[start:new_end] replaced old source[start:end]
+        buffer = TokenBuffer(code, self.names)
+        delta = new_end - end
+
+        # Restart right after the last newline before the edit: the scanner keeps no state across it
+        index = bisect_left(self.starts, start) - 1
+        while index >= 0 and self.kinds[index] != NEWLINE_CODE:
+            index -= 1
+        position = self.starts[index] if index >= 0 else -1
+        line_count = bisect_right(self.lines.breaks, position + 1)
+
+        buffer.kinds.extend(self.kinds[:index + 1])
+        buffer.starts.extend(array(buffer.starts.typecode, self.starts[:index + 1]))
+        buffer.ends.extend(array(buffer.ends.typecode, self.ends[:index + 1]))
+        buffer.name_ids.extend(self.name_ids[:index + 1])
+        buffer.lines.breaks.extend(self.lines.breaks[:line_count])
+        buffer.lines.starts.extend(self.lines.starts[:line_count])
+
+        def resync(newline: int) -> bool:
+            # Past the edit, a newline also found in the old stream ends the rescan
+            old_newline = newline - delta
+            old_index = bisect_left(self.starts, old_newline)
+            if old_index == len(self.kinds) or self.starts[old_index] != old_newline:
+                return False
+            if self.kinds[old_index] != NEWLINE_CODE:
+                return False
+            old_line_count = bisect_right(self.lines.breaks, old_newline + 1)
+            if self.error is not None and old_line_count != len(buffer.lines):
+                # The pending error message would name a stale line
+                return False
+
+            shift = delta.__add__
+            buffer.kinds.extend(self.kinds[old_index + 1:])
+            buffer.starts.extend(array(buffer.starts.typecode, map(shift, self.starts[old_index + 1:])))
+            buffer.ends.extend(array(buffer.ends.typecode, map(shift, self.ends[old_index + 1:])))
+            buffer.name_ids.extend(self.name_ids[old_index + 1:])
+            buffer.lines.breaks.extend(map(shift, self.lines.breaks[old_line_count:]))
+            buffer.lines.starts.extend(map(shift, self.lines.starts[old_line_count:]))
+            buffer.error = self.error
+            return True
+
+        buffer.scan(position, new_end, resync)
+        return buffer
+
+    def scan_vectorized(self) -> bool:
+        # Classifies all bytes at once with NumPy. Gives up on anything unusual, leaving it to scan
+        source = self.source
+        if isinstance(source, str):
+            if not source.isascii():
+                return False
+            source = source.encode()
+        elif isinstance(source, memoryview):
+            # Slices of a memoryview can not be looked up in dicts
+            return False
+        data = np.frombuffer(source, np.uint8)
+        size = len(data)
+        classes = char_classes[data]
+
+        # String literals and comments are met in order: a quote inside a comment is no string and vice versa
+        newlines = np.flatnonzero(data == NEWLINE_BYTE)
+        quotes = {QUOTE_BYTES[0]: np.flatnonzero(data == QUOTE_BYTES[0]), QUOTE_BYTES[1]: np.flatnonzero(data == QUOTE_BYTES[1])}
+        literal_starts, literal_ends, literal_kinds = [], [], []
+        end = 0
+        for start in np.flatnonzero((classes == QUOTE_CLASS) | (classes == HASH_CLASS)).tolist():
+            if start < end:
+                continue
+            char = int(data[start])
+            if char == HASH_BYTE:
+                i = np.searchsorted(newlines, start)
+                end = int(newlines[i]) if i < len(newlines) else size
+                literal_kinds.append(COMMENT_CODE)
+            else:
+                closing = quotes[char]
+                i = np.searchsorted(closing, start + 1)
+                if i == len(closing):
+                    return False
+                end = int(closing[i]) + 1
+                literal_kinds.append(STR_CODE)
+            literal_starts.append(start)
+            literal_ends.append(end)
+        literal_starts = np.array(literal_starts, np.int64)
+        literal_ends = np.array(literal_ends, np.int64)
+        literal_kinds = np.array(literal_kinds, np.uint8)
+        classes[span_mask(literal_starts + 1, literal_ends, size)] = LITERAL_CLASS
+        if (classes == OTHER_CLASS).any():
+            return False
+
+        # Runs of word chars are identifiers and numbers
+        word_starts, word_ends = find_runs((classes == ALPHA_CLASS) | (classes == DIGIT_CLASS) | (classes == UNDERSCORE_CLASS))
+        padded = np.append(classes, BLANK_CLASS)
+        first_classes = classes[word_starts]
+        if (first_classes == UNDERSCORE_CLASS).any():
+            return False
+
+        is_id = first_classes == ALPHA_CLASS
+        id_starts, id_ends = word_starts[is_id], word_ends[is_id]
+        has_question = padded[id_ends] == QUESTION_CLASS
+        id_ends = id_ends + has_question
+        if np.count_nonzero(classes == QUESTION_CLASS) != np.count_nonzero(has_question):
+            return False
+        if np.isin(padded[id_ends], word_classes).any():
+            return False
+
+        # Plain integers are checked here, the rest of the numbers by the master pattern
+        number_starts, number_ends = word_starts[~is_id], word_ends[~is_id]
+        letters = np.concatenate(([0], np.cumsum((classes == ALPHA_CLASS) | (classes == UNDERSCORE_CLASS))))
+        is_plain = (
+            (letters[number_ends] == letters[number_starts])
+            & ((data[number_starts] != ZERO_BYTE) | (number_ends - number_starts == 1))
+            & plain_number_end[np.append(data, NEWLINE_BYTE)[number_ends]]
+        )
+        complex_starts, complex_ends, complex_kinds = [], [], []
+        match = bytes_master_pattern.match
+        end = 0
+        for start in number_starts[~is_plain].tolist():
+            if start < end:
+                # Digits after the dot or the exponent sign of the previous number
+                continue
+            m = match(source, start)
+            kind = m.lastgroup if m is not None else None
+            if kind != "INTEGER" and kind != "RANGE_INT" and kind != "FLOAT" or m.start(kind) != start:
+                return False
+            end = m.end()
+            complex_starts.append(start)
+            complex_ends.append(end)
+            complex_kinds.append(FLOAT_CODE if kind == "FLOAT" else INTEGER_CODE)
+        complex_starts = np.array(complex_starts, np.int64)
+        complex_ends = np.array(complex_ends, np.int64)
+        covered = span_mask(complex_starts + 1, complex_ends, size)
+        is_free = ~covered[id_starts]
+        id_starts, id_ends = id_starts[is_free], id_ends[is_free]
+        is_free = ~covered[number_starts] & is_plain
+        int_starts, int_ends = number_starts[is_free], number_ends[is_free]
+
+        # Operators: single chars map directly, longer runs are split longest match first
+        op_starts, op_ends = find_runs((classes == OP_CHAR_CLASS) & ~covered)
+        is_single = op_ends - op_starts == 1
+        split_starts, split_ends, split_kinds = [], [], []
+        for start, end in zip(op_starts[~is_single].tolist(), op_ends[~is_single].tolist()):
+            while start < end:
+                for length in (3, 2, 1):
+                    symbol = bytes_ops.get(source[start:start + length]) if start + length <= end else None
+                    if symbol is not None:
+                        break
+                split_starts.append(start)
+                split_ends.append(start + length)
+                split_kinds.append(token_codes[symbol])
+                start += length
+        op_starts = op_starts[is_single]
+        bracket_starts = np.flatnonzero(classes == BRACKET_CLASS)
+        newline_starts = np.flatnonzero(classes == NEWLINE_CLASS)
+
+        # Identifiers are labelled and interned only once nothing can fail
+        id_kinds = np.full(len(id_starts), ID_CODE, np.uint8)
+        id_name_ids = np.zeros(len(id_starts), np.uint32)
+        intern = self.names.intern
+        for i, (start, end) in enumerate(zip(id_starts.tolist(), id_ends.tolist())):
+            name = source[start:end]
+            symbol = bytes_keywords.get(name)
+            if symbol is None:
+                id_name_ids[i] = intern(name)
+            else:
+                id_kinds[i] = token_codes[symbol]
+
+        starts = np.concatenate((
+            id_starts, int_starts, complex_starts, op_starts, np.array(split_starts, np.int64),
+            bracket_starts, literal_starts, newline_starts
+        ))
+        ends = np.concatenate((
+            id_ends, int_ends, complex_ends, op_starts + 1, np.array(split_ends, np.int64),
+            bracket_starts + 1, literal_ends, newline_starts + 1
+        ))
+        kinds = np.concatenate((
+            id_kinds, np.full(len(int_starts), INTEGER_CODE, np.uint8), np.array(complex_kinds, np.uint8),
+            single_char_codes[data[op_starts]], np.array(split_kinds, np.uint8),
+            single_char_codes[data[bracket_starts]], literal_kinds, np.full(len(newline_starts), NEWLINE_CODE, np.uint8)
+        ))
+        name_ids = np.concatenate((id_name_ids, np.zeros(len(starts) - len(id_starts), np.uint32)))
+        order = np.argsort(starts, kind="stable")
+        starts, ends, kinds, name_ids = starts[order], ends[order], kinds[order], name_ids[order]
+
+        # The char scanner steps past the end of file after a trailing operator
+        eof = size
+        if len(kinds) and ends[-1] == size and op_codes[kinds[-1]]:
+            eof += 1
+        offset_type = np.uint32 if self.starts.typecode == "I" else np.uint64
+        self.kinds.frombytes(np.append(kinds, EOF_CODE).astype(np.uint8).tobytes())
+        self.starts.frombytes(np.append(starts, eof).astype(offset_type).tobytes())
+        self.ends.frombytes(np.append(ends, eof).astype(offset_type).tobytes())
+        self.name_ids.frombytes(np.append(name_ids, 0).astype(np.uint32).tobytes())
+
+        # A newline starts the next line after itself, a comment at its end
+        comment_ends = literal_ends[literal_kinds == COMMENT_CODE]
+        breaks = np.concatenate((newline_starts + 1, comment_ends))
+        line_starts = np.concatenate((newline_starts + 1, comment_ends + 1))
+        order = np.argsort(breaks, kind="stable")
+        self.lines.breaks.frombytes(breaks[order].astype(np.int64).tobytes())
+        self.lines.starts.frombytes(line_starts[order].astype(np.int64).tobytes())
+        return True
+
+    def scan(self, position: int, resync_from: int = -1, resync=None):
+        code = self.source
+        lexer = Lexer()
+        lexer.setup(code)
+        lexer.lines = self.lines
+
+        if self.is_bytes:
+            pattern, op_codes, bracket_codes, keyword_codes = bytes_master_pattern, bytes_ops, bytes_brackets, bytes_keywords
+            fallback = lexer.next_token_bytes_fallback
+        else:
+            pattern, op_codes, bracket_codes, keyword_codes = master_pattern, ops, brackets, keywords
+            fallback = lexer.next_token_fallback
+
+        match = pattern.match
+        add_kind = self.kinds.append
+        add_start = self.starts.append
+        add_end = self.ends.append
+        add_name_id = self.name_ids.append
+        intern = self.names.intern
+        add_line_break = self.lines.add
+        code_len = len(code)
+
+        while True:
+            m = match(code, position + 1)
+            if m is None:
+                lexer.position = position
+                try:
+                    has_next = fallback()
+                except (LexicalError, IndexError) as e:
+                    self.error = e
+                    break
+                add_kind(token_codes[lexer.token.symbol])
+                add_start(lexer.token_start)
+                add_end(max(lexer.token_start, min(lexer.position + 1, code_len)))
+                add_name_id(intern(lexer.token.value) if lexer.token.symbol == Special.ID else 0)
+                position = lexer.position
+                if not has_next:
+                    break
+                continue
+
+            kind = m.lastgroup
+            start = m.start(kind)
+            end = m.end()
+            name_id = 0
+
+            if kind == "ID":
+                name = m.group(kind)
+                symbol = keyword_codes.get(name)
+                if symbol is None:
+                    add_kind(ID_CODE)
+                    name_id = intern(name)
+                else:
+                    add_kind(token_codes[symbol])
+            elif kind == "OP":
+                add_kind(token_codes[op_codes[m.group(kind)]])
+            elif kind == "INTEGER" or kind == "RANGE_INT":
+                add_kind(INTEGER_CODE)
+            elif kind == "NEWLINE":
+                add_kind(NEWLINE_CODE)
+            elif kind == "BRACKET":
+                add_kind(token_codes[bracket_codes[m.group(kind)]])
+            elif kind == "FLOAT":
+                add_kind(FLOAT_CODE)
+            elif kind == "DQ_STR" or kind == "SQ_STR":
+                add_kind(STR_CODE)
+                start -= 1
+            elif kind == "COMMENT":
+                add_kind(COMMENT_CODE)
+                start -= 1
+            else:
+                position = max(position + 1, end)
+                add_kind(EOF_CODE)
+                add_start(position)
+                add_end(position)
+                add_name_id(0)
+                break
+
+            add_start(start)
+            add_end(end)
+            add_name_id(name_id)
+
+            if kind == "NEWLINE":
+                add_line_break(end, end)
+                if resync_from <= start and resync is not None and resync(start):
+                    break
+            elif kind == "COMMENT":
+                # The char scanner counts a commented line twice: here and on the NEWLINE token
+                add_line_break(end, end + 1)
+            elif kind == "OP" and end == code_len:
+                # The char scanner steps past the end of file after a trailing operator
+                end += 1
+
+            position = end - 1
+
+
+class TokenCursor:
+    def __init__(self, buffer: TokenBuffer, index: int = -1):
+        self.buffer = buffer
+        self.index = index
+        self.overrun = 0
+        # The cursor is its own current token, so no object is created per token
+        self.token = self
+
+    def next_token(self) -> bool:
+        if self.index + 1 < len(self.buffer.kinds):
+            self.index += 1
+        elif self.buffer.error is not None:
+            raise self.buffer.error
+        else:
+            # Reading past the end repeats EOF one column further, as the lexer does
+            self.overrun += 1
+        return self.buffer.kinds[self.index] != EOF_CODE
+
+    def seek(self, index: int):
+        self.index = index
+        self.overrun = 0
+
+    @property
+    def symbol(self) -> Enum:
+        return token_kinds[self.buffer.kinds[self.index]]
+
+    @property
+    def value(self) -> str | None:
+        return self.buffer.value(self.index)
+
+    @property
+    def name_id(self) -> int:
+        return self.buffer.name_ids[self.index]
+
+    @property
+    def pos(self) -> tuple[int, int]:
+        return self.buffer.pos(self.index, self.overrun)
+
+
+def lex_shard(path: str, start: int, end: int):
+    # Offsets are kept relative to the whole file, the scan stops at the newline ending the shard
+    buffer = TokenBuffer(map_file(path))
+    if end < len(buffer.source):
+        buffer.scan(start - 1, end - 1, lambda newline: True)
+        is_complete = buffer.error is None and buffer.kinds[-1] == NEWLINE_CODE and buffer.starts[-1] == end - 1
+    else:
+        buffer.scan(start - 1)
+        is_complete = buffer.error is None
+    if not is_complete:
+        return None
+    lines = buffer.lines
+    return buffer.kinds, buffer.starts, buffer.ends, buffer.name_ids, lines.breaks, lines.starts, buffer.names.names
+
+
+def parallel_lex(path: str, workers: int = None) -> TokenBuffer:
+    source = map_file(path)
+    workers = workers if workers is not None else os.cpu_count()
+
+    # Tokens never span a newline except string literals, so shards end right after one
+    bounds = [0]
+    for i in range(1, workers):
+        newline = source.find(b"\n", max(bounds[-1], len(source) * i // workers))
+        if newline < 0:
+            break
+        if newline + 1 < len(source):
+            bounds.append(newline + 1)
+    bounds.append(len(source))
+    if len(bounds) <= 2:
+        return TokenBuffer.tokenize(source)
+
+    with ProcessPoolExecutor(len(bounds) - 1) as executor:
+        shards = list(executor.map(lex_shard, repeat(path), bounds[:-1], bounds[1:]))
+
+    # A string literal running into the next shard keeps the scan from stopping at the shard end.
+    # Errors are left to the sequential scanner, which reports them with the right position.
+    if any(shard is None for shard in shards):
+        return TokenBuffer.tokenize(source)
+
+    buffer = TokenBuffer(source)
+    for kinds, starts, ends, name_ids, breaks, line_starts, names in shards:
+        name_map = [buffer.names.intern(name) for name in names]
+        if name_map != list(range(len(name_map))):
+            name_ids = array("I", (name_map[n] if kind == ID_CODE else 0 for kind, n in zip(kinds, name_ids)))
+        buffer.kinds.extend(kinds)
+        buffer.starts.extend(starts)
+        buffer.ends.extend(ends)
+        buffer.name_ids.extend(name_ids)
+        buffer.lines.breaks.extend(breaks)
+        buffer.lines.starts.extend(line_starts)
+
+    return buffer
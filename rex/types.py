@@ -1,23 +1,3 @@
-class NumberOfUsesTable:
-    def __init__(self):
-        self.use_table = [0]
-
-    def new_order(self):
-        self.use_table.append(0)
-
-    def get(self, order: int = 0):
-        return self.use_table[-(order + 1)]
-
-    def increase(self, order: int = 0):
-        self.use_table[-(order + 1)] += 1
-
-    def decrease(self, order: int = 0):
-        self.use_table[-(order + 1)] -= 1
-
-    def remove(self, order: int = 0):
-        del self.use_table[-(order + 1)]
-
-
 class AnyType:
     pass
 
@@ -34,9 +14,28 @@ class ArrayType:
     pass
 
 
+class ExprType:
+    def __init__(self, fundamental: type, string: bool, numeric: bool):
+        self.fundamental = fundamental
+        # Whether the expression may be used as a string or a numeric operand
+        self.string = string
+        self.numeric = numeric
+
+
 class SemanticType:
+    # Every definition gets its own instance, which is its def-use record
     def __init__(self):
-        self.number_of_uses: NumberOfUsesTable = NumberOfUsesTable()
+        # Nodes reading this definition
+        self.uses: list = list()
+        # Uses made by statements removed as dead code
+        self.dropped_uses = 0
+
+    def add_use(self, node):
+        node._definition = self
+        self.uses.append(node)
+
+    def is_live(self) -> bool:
+        return len(self.uses) > self.dropped_uses
 
 
 class Variable(SemanticType):
@@ -60,6 +59,8 @@ class Function(SemanticType):
         super().__init__()
         self.args_count = args_count
         self.return_type = return_type
+        # Body left by the pre-parse of the parser, parsed on the first reference
+        self.body = None
 
 
 class PredefinedFunction(Function):
@@ -0,0 +1,77 @@
+from rex.nodes import Node
+
+
+class NodeVisitor:
+    # Calls visit_<class name>() for a node, the method of the nearest base class is used when the class of the
+    # node has none. Methods found for every node class are cached per visitor class
+    _methods: dict[type, str | None] = dict()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._methods = dict()
+
+    def visit(self, node: Node):
+        name = self._methods.get(type(node), False)
+        if name is False:
+            name = self.find_method(type(node))
+        if name is None:
+            return self.generic_visit(node)
+        return getattr(self, name)(node)
+
+    def find_method(self, node_type: type) -> str | None:
+        name = None
+        for cls in node_type.__mro__:
+            if hasattr(self, f"visit_{cls.__name__}"):
+                name = f"visit_{cls.__name__}"
+                break
+        self._methods[node_type] = name
+        return name
+
+    def generic_visit(self, node: Node):
+        return None
+
+    def visit_tree(self, tree: Node):
+        # Visits every node of the tree in pre-order, without recursion
+        for node in tree.walk():
+            self.visit(node)
+
+
+class NodeTransformer(NodeVisitor):
+    # Replaces every node of a tree by the result of visiting it, children are visited before their parent.
+    # A node visited to None is removed from the list holding it
+    def generic_visit(self, node: Node):
+        return node
+
+    def transform(self, tree: Node) -> Node | None:
+        # Nodes with the node or the list holding them, every node comes after its parent
+        order = [(None, None, tree)]
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            children = []
+            for name in node.fields:
+                value = getattr(node, name)
+                if isinstance(value, Node):
+                    children.append((node, name, value))
+                elif isinstance(value, list):
+                    children.extend((value, i, item) for i, item in enumerate(value) if isinstance(item, Node))
+            order.extend(children)
+            stack.extend(child for _, _, child in reversed(children))
+
+        shrunk = dict()
+        result = tree
+        for holder, key, node in reversed(order):
+            replacement = self.visit(node)
+            if holder is None:
+                result = replacement
+            elif replacement is node:
+                continue
+            elif isinstance(holder, list):
+                holder[key] = replacement
+                if replacement is None:
+                    shrunk[id(holder)] = holder
+            else:
+                setattr(holder, key, replacement)
+        for holder in shrunk.values():
+            holder[:] = [item for item in holder if item is not None]
+        return result
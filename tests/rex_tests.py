@@ -1,8 +1,26 @@
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
 import unittest
-from rex.lexer import Lexer
-from rex.parser import Parser
+from rex.arena import AstArena
+from rex.dump import dump_tree, dump_sexpr, dump_json
+from rex.lexer import Lexer, LexicalError, LazyToken, map_file
+from rex.nodes import NodeFuncDec, NodeInteger, NodeNewLine, NodePlus, NodeProgram, NodeVariable
+from rex import grammar
+from rex.grammar_tables import STMT_DISPATCH
+from rex.hashcons import NodeFactory
+from rex.incremental import IncrementalParser
+from rex.parser import Parser, ParsingError
+from rex.session import Session
+from rex.stats import ast_memory
+from rex.token_buffer import TokenBuffer, TokenCursor, parallel_lex
 from rex.symbols import *
-from rex.symtable import SemanticError
+from rex.symtable import SemanticError, SymTable
+from rex.types import Variable, NumericType, StringType, ArrayType
+from rex.visitor import NodeVisitor, NodeTransformer
 
 
 def read_code(path: str) -> str:
@@ -348,6 +366,232 @@ class RexLexerTests(unittest.TestCase):
         self.assertListEqual(parsed_tokens, expected_result)
 
 
+class RexRegexScannerTests(unittest.TestCase):
+    def scan(self, code: str, use_regex: bool) -> list:
+        rex = Lexer(use_regex)
+        rex.setup(code)
+
+        parsed_tokens = list()
+        try:
+            while rex.next_token():
+                parsed_tokens.append(str(rex.token))
+            parsed_tokens.append(str(rex.token))
+        except LexicalError as e:
+            parsed_tokens.append(str(e))
+        return parsed_tokens
+
+    def assertSameTokens(self, code: str):
+        self.assertListEqual(self.scan(code, True), self.scan(code, False))
+
+    def test_sameTokensOnTestCodes(self):
+        for name in ['code_1.rb', 'cycles.rb', 'functions.rb', 'if.rb', 'variables.rb']:
+            self.assertSameTokens(read_code(f'codes/{name}'))
+
+    def test_sameTokensOnEdgeCases(self):
+        codes = [
+            "# comment\nx = 1 # tail",
+            "a **= 2 ** 3\nb = a +",
+            "x = 'multi\nline' + \"str\"\ny",
+            "1..5\n00..5\n1e5\n0.01e4 1.5.3 1.x",
+            "a? = b\n\t\r\n  \x0c",
+        ]
+        for code in codes:
+            self.assertSameTokens(code)
+
+    def test_sameErrors(self):
+        codes = ["12abc", "000111", "1e", "1.5e+", "_a", "a?b", "\"abc", "x = @", "é = 1"]
+        for code in codes:
+            self.assertSameTokens(code)
+            self.assertRaises(LexicalError, self.scan_raising, code)
+
+    def test_positionsResolvedOnDemand(self):
+        rex = Lexer()
+        rex.setup("# note\nx = 'a\nb'\ny")
+        while rex.next_token():
+            self.assertIs(rex.token.lines, rex.lines)
+        self.assertEqual(rex.lines.resolve(7), (3, 7))
+        self.assertSameTokens("# note\nx = 'a\nb'\ny")
+
+    def test_errorPositions(self):
+        parser = Parser()
+        parser.setup("a = 1\n# note\nb = (")
+        self.assertRaisesRegex(ParsingError, r"^\(4, 6\) : ", parser.parse)
+        parser.setup("a = 1\n# note\nc = b\n")
+        self.assertRaisesRegex(SemanticError, r"^Ошибка семантического анализа \(4, 6\): ", parser.parse)
+
+    def scan_raising(self, code: str):
+        rex = Lexer()
+        rex.setup(code)
+        while rex.next_token():
+            pass
+
+
+class RexStreamLexerTests(unittest.TestCase):
+    def scan(self, code: str) -> list:
+        rex = Lexer()
+        rex.setup(code)
+
+        parsed_tokens = list()
+        while rex.next_token():
+            parsed_tokens.append(str(rex.token))
+        parsed_tokens.append(str(rex.token))
+        return parsed_tokens
+
+    def test_chunkBoundaries(self):
+        code = '''\
+               # comment across chunks
+               x **= 10.25e3 + 'multi
+               line string'
+               for i in 0..5 do
+                   y = "привет" + i
+               end\
+               '''
+
+        expected_tokens = self.scan(code)
+        for chunk_size in [1, 2, 3, 7, 64]:
+            stream_tokens = [str(t) for t in Lexer().iter_tokens(io.StringIO(code), chunk_size)]
+            self.assertListEqual(stream_tokens, expected_tokens)
+
+            stream_tokens = [str(t) for t in Lexer().iter_tokens(io.BytesIO(code.encode()), chunk_size)]
+            self.assertListEqual(stream_tokens, expected_tokens)
+
+    def test_errorAtEndOfStream(self):
+        tokens = Lexer().iter_tokens(io.StringIO('a = "abc'), 2)
+        self.assertRaises(LexicalError, list, tokens)
+
+
+class RexBytesLexerTests(unittest.TestCase):
+    def scan(self, code) -> list:
+        rex = Lexer()
+        rex.setup(code)
+
+        parsed_tokens = list()
+        try:
+            while rex.next_token():
+                parsed_tokens.append(str(rex.token))
+            parsed_tokens.append(str(rex.token))
+        except LexicalError as e:
+            parsed_tokens.append(str(e))
+        return parsed_tokens
+
+    def test_sameTokensAsText(self):
+        codes = [
+            read_code('codes/functions.rb'),
+            "# Комментарий\nимя = 'строка'\n",
+            "x = 'многострочная\nстрока' + 1 # конец",
+            "aé = 1\n\x1c b = 2.5e3 **= c\n",
+            "1abc",
+            'a = "незакрытая',
+        ]
+        for code in codes:
+            expected_tokens = self.scan(code)
+            self.assertListEqual(self.scan(code.encode()), expected_tokens)
+            self.assertListEqual(self.scan(memoryview(code.encode())), expected_tokens)
+
+    def test_mappedFile(self):
+        parser = Parser()
+        parser.setup(map_file('codes/cycles.rb'))
+        mapped_code = parser.parse().generate()
+
+        parser.setup(read_code('codes/cycles.rb'))
+        self.assertEqual(mapped_code, parser.parse().generate())
+
+    def test_lazyValues(self):
+        rex = Lexer()
+        rex.setup(b"name = 'value'")
+
+        rex.next_token()
+        self.assertIsInstance(rex.token, LazyToken)
+        self.assertEqual((rex.token.start, rex.token.end), (0, 4))
+        self.assertEqual(rex.token.value, 'name')
+
+
+class RexTokenBufferTests(unittest.TestCase):
+    def test_sameTokensAsLexer(self):
+        for code in [read_code('codes/functions.rb'), "# комментарий\nx **= 'a\nb' + 1.5\n", b"a = 1 +"]:
+            rex = Lexer()
+            rex.setup(code)
+            expected_tokens = list()
+            while rex.next_token():
+                expected_tokens.append(rex.token)
+            expected_tokens.append(rex.token)
+
+            buffer = TokenBuffer.tokenize(code)
+            self.assertListEqual([buffer[i] for i in range(len(buffer))], expected_tokens)
+
+    def test_cursor(self):
+        cursor = TokenCursor(TokenBuffer.tokenize("a = 10\n"))
+        parsed_tokens = list()
+        while cursor.next_token():
+            parsed_tokens.append((cursor.token.symbol, cursor.token.value, cursor.token.pos))
+        parsed_tokens.append((cursor.token.symbol, cursor.token.value, cursor.token.pos))
+
+        expected_result = [
+            (Special.ID, 'a', (1, 1)),
+            (Operators.EQUALS, None, (1, 3)),
+            (Special.INTEGER, '10', (1, 5)),
+            (Special.NEWLINE, None, (1, 7)),
+            (Special.EOF, None, (2, 1)),
+        ]
+        self.assertListEqual(parsed_tokens, expected_result)
+
+    def test_errorRaisedWhenReached(self):
+        cursor = TokenCursor(TokenBuffer.tokenize("a = 1\nb = 12abc"))
+        for i in range(6):
+            cursor.next_token()
+        self.assertEqual(cursor.token.symbol, Operators.EQUALS)
+        self.assertRaises(LexicalError, cursor.next_token)
+
+    def test_relex(self):
+        code = "a = 1\nb = 'x\ny'\n# note\nc = a + b\n"
+        buffer = TokenBuffer.tokenize(code)
+        edits = [(0, 0, "z = 2\n"), (4, 5, "10 + 2"), (9, 12, "'"), (20, 26, ""), (len(code), len(code), "d")]
+        for start, end, text in edits:
+            new_code = code[:start] + text + code[end:]
+            edited = buffer.relex(new_code, start, end, start + len(text))
+            expected = TokenBuffer.tokenize(new_code)
+            self.assertListEqual([edited[i] for i in range(len(edited))], [expected[i] for i in range(len(expected))])
+
+    def test_internedNames(self):
+        for code in ["a = 1\nbb = a + a\n", b"a = 1\nbb = a + a\n"]:
+            buffer = TokenBuffer.tokenize(code)
+            ids = [buffer.name_ids[i] for i in range(len(buffer)) if buffer.symbol(i) == Special.ID]
+            self.assertListEqual(ids, [0, 1, 0, 0])
+            self.assertListEqual(buffer.names.names, ["a", "bb"])
+            self.assertIs(buffer.value(0), buffer.value(6))
+
+    def test_parallelLex(self):
+        codes = [read_code('codes/functions.rb') * 20, "a = 'x\n" + "y\n" * 50 + "'\nb = a\n", "a = 'x\n" * 10]
+        for code in codes:
+            with tempfile.NamedTemporaryFile("w", suffix=".rb", encoding="utf-8", delete=False) as f:
+                f.write(code)
+            try:
+                buffer = parallel_lex(f.name, workers=3)
+            finally:
+                os.unlink(f.name)
+            expected = TokenBuffer.tokenize(code)
+            self.assertListEqual([buffer[i] for i in range(len(buffer))], [expected[i] for i in range(len(expected))])
+            self.assertEqual(str(buffer.error), str(expected.error))
+
+    @unittest.skipIf(importlib.util.find_spec("numpy") is None, "NumPy is not installed")
+    def test_numpyPrePass(self):
+        codes = [read_code('codes/functions.rb'), read_code('codes/cycles.rb'), "x = 1.5e-3 + 1..5\n# note\ny? = 'a\nb' ** 0"]
+        for code in codes:
+            for source in [code, code.encode()]:
+                buffer = TokenBuffer(source)
+                self.assertTrue(buffer.scan_vectorized())
+                expected = TokenBuffer.tokenize(source, use_numpy=False)
+                self.assertListEqual([buffer[i] for i in range(len(buffer))], [expected[i] for i in range(len(expected))])
+                self.assertListEqual(list(buffer.name_ids), list(expected.name_ids))
+        # Malformed code is left to the scanner
+        self.assertFalse(TokenBuffer("x = 12abc").scan_vectorized())
+        self.assertFalse(TokenBuffer("x = 'abc").scan_vectorized())
+
+    def test_bytesPerToken(self):
+        buffer = TokenBuffer.tokenize(read_code('codes/functions.rb') * 100)
+        self.assertLess(buffer.bytes_per_token(), 20)
+
+
 class RexParserTests(unittest.TestCase):
     def setUp(self) -> None:
         self.parser = Parser()
@@ -383,6 +627,328 @@ class RexParserTests(unittest.TestCase):
         parse_result = self.parser.parse()
         print(parse_result)
 
+    def test_parallelParse(self):
+        code = 'g = 10\nunused = 1\n'
+        for i in range(40):
+            code += f'def f{i}(a)\n  b = g + a\n  puts(b)\n  return f{i - 1}(b)\nend\n' if i else 'def f0(a)\n  return a\nend\n'
+            code += '# comment\n\n' if i % 7 == 0 else ''
+        code += 'puts(f39(1))\n'
+
+        self.parser.setup(code)
+        expected = self.parser.parse().generate()
+        expected_removed = self.parser.removed_statements
+
+        class CountingParser(Parser):
+            batches = 0
+
+            def submit_function_batch(self, batch):
+                CountingParser.batches += 1
+                return super().submit_function_batch(batch)
+
+        parser = CountingParser()
+        parser.setup(code)
+        self.assertEqual(expected, parser.parse_parallel(workers=2).generate())
+        self.assertEqual(expected_removed, parser.removed_statements)
+        self.assertGreater(CountingParser.batches, 1)
+
+        broken = code.replace('def f20(a)\n  b = g + a', 'def f20(a)\n  b = h + a')
+        self.parser.setup(broken)
+        with self.assertRaises(SemanticError) as sequential:
+            self.parser.parse()
+        self.parser.setup(broken)
+        with self.assertRaises(SemanticError) as parallel:
+            self.parser.parse_parallel(workers=2)
+        self.assertEqual(str(sequential.exception), str(parallel.exception))
+
+    def test_incrementalParse(self):
+        code = 'g = 10\nunused = 1\n'
+        for i in range(20):
+            code += f'def f{i}(a)\n  b = 2 + a\n  puts(b)\n  return f{i - 1}(g)\nend\n' if i else 'def f0(a)\n  return a\nend\n'
+        code += 'puts(f19(g))\n'
+
+        def translate(code):
+            parser = Parser()
+            parser.setup(code)
+            return parser.parse().generate(), parser.removed_statements
+
+        incremental = IncrementalParser()
+        self.assertEqual(translate(code)[0], incremental.translate(code))
+        first = incremental.update(code).child
+
+        edited = code.replace('def f5(a)\n  b = 2 + a', 'def f5(a)\n  b = 3 + a')
+        self.assertEqual(translate(edited), (incremental.translate(edited), incremental.removed_statements))
+        self.assertEqual(len(incremental.cache) - 1, incremental.reused)
+        second = incremental.update(edited).child
+        self.assertIs(first[3], second[3])
+        self.assertIsNot(first[6], second[6])
+
+        # Changing the type of a global reparses the statements using it, only "unused = 1" and f0 are kept
+        retyped = edited.replace('g = 10', 'g = "s"')
+        self.assertEqual(translate(retyped)[0], incremental.translate(retyped))
+        self.assertEqual(2, incremental.reused)
+
+        broken = edited.replace('puts(f19(g))', 'puts(f19(h))')
+        self.assertRaises(SemanticError, incremental.translate, broken)
+        self.assertEqual(translate(edited)[0], incremental.translate(edited))
+
+    def test_lazyFunctionBodies(self):
+        code = 'g = 10\n'
+        for i in range(20):
+            code += f'def f{i}(a, b)\n  c = {i} * b + a\n  if c > 1 then\n    puts(c)\n  end\n  return c\nend\n'
+        code += 'def used(x)\n  return f7(x, g)\nend\ng = "redefined"\nputs(used(1))\n'
+        self.parser.setup(code)
+        expected = self.parser.parse().generate()
+
+        parser = Parser(lazy_functions=True)
+        parser.setup(code)
+        program = parser.parse()
+        self.assertEqual(expected, program.generate())
+        self.assertEqual(['f7', 'used'], [stmt.id for stmt in program.child if isinstance(stmt, NodeFuncDec)])
+
+        # Bodies of unused functions are never parsed
+        parser.setup('def f()\n  return missing\nend\nputs(1)\n')
+        self.assertEqual('print(1)\n', parser.parse().generate())
+        parser.setup('def f()\n  return missing\nend\nputs(f())\n')
+        self.assertRaises(SemanticError, parser.parse)
+
+    def test_session(self):
+        inputs = ['a = 1\nunused = 2\n', 'def f(x)\n  b = a + x\n  return b\nend\n', 'c = f(a)\n', 'puts(c)\n']
+        self.parser.setup(''.join(inputs))
+        expected = self.parser.parse().generate()
+
+        session = Session()
+        self.assertEqual('a <- 1\nunused <- 2\n', session.submit(inputs[0]))
+        for code in inputs[1:]:
+            session.submit(code)
+        self.assertEqual(expected, session.flush())
+
+        # A rejected input leaves no definitions and uses behind
+        self.assertRaises(SemanticError, session.submit, 'd = a\ne = missing\n')
+        self.assertRaises(ParsingError, session.submit, 'def g(x)\n  y = a +\nend\n')
+        self.assertEqual(1, len(session.symtable.name_spaces))
+        self.assertRaises(SemanticError, session.submit, 'puts(d)\n')
+        self.assertEqual('', session.flush())
+        self.assertEqual('print(a)\n', session.submit('puts(a)\n'))
+
+        # An input failing while its code is generated is rejected as well
+        session.flush()
+        self.assertRaises(ZeroDivisionError, session.submit, 'z = 1 / 0\n')
+        self.assertEqual([], session.statements)
+        self.assertRaises(SemanticError, session.submit, 'puts(z)\n')
+        self.assertEqual('', session.flush())
+
+    def test_visitors(self):
+        self.parser.setup('a = 1\nb = 2\nc = (a + 1) * (b - 3)\nputs(c)\n')
+        program = self.parser.parse()
+        self.assertEqual([type(node).__name__ for node in program.leaves()],
+                         [type(node).__name__ for node in program.iterate()])
+
+        class Counter(NodeVisitor):
+            def __init__(self):
+                self.binary = self.other = 0
+
+            def visit_NodeBinOperator(self, node):
+                self.binary += 1
+
+            def generic_visit(self, node):
+                self.other += 1
+
+        counter = Counter()
+        counter.visit_tree(program)
+        self.assertEqual((6, sum(1 for _ in program.walk()) - 6), (counter.binary, counter.other))
+        self.assertEqual('visit_NodeBinOperator', Counter._methods[NodePlus])
+        self.assertNotIn(NodePlus, NodeVisitor._methods)
+        self.assertIs(self.parser.symtable.get_variable(self.parser.symtable.names.intern('c')),
+                      program.child[-1].params.arguments[0]._definition)
+
+        class Renamer(NodeTransformer):
+            def visit_NodeVariable(self, node):
+                return NodeVariable(node.id.upper(), node.name_id)
+
+            def visit_NodeNewLine(self, node):
+                return None
+
+        self.parser.setup('a = 1\n\nputs(a + a)\n\n')
+        program = self.parser.parse()
+        program.child.insert(1, NodeNewLine())
+        self.assertIs(program, Renamer().transform(program))
+        self.assertEqual('A <- 1\nprint(A + A)\n', program.generate())
+
+    def test_slottedNodes(self):
+        self.parser.setup('def f(a)\n  return a\nend\nx = 2 * 3\nputs(f(x))\n')
+        program = self.parser.parse()
+        for node in program.walk():
+            self.assertFalse(hasattr(node, '__dict__'), type(node).__name__)
+        self.assertEqual(('id', 'name_id', 'params', 'block', 'indent'), NodeFuncDec.fields)
+
+        memory = ast_memory(program)
+        self.assertIn('NodeDeclareParams', memory)
+        self.assertEqual(4 * sys.getsizeof(program.child[1].left), memory['NodeVariable'])
+
+    def test_astArena(self):
+        code = read_code('codes/functions.rb') + '\n' + read_code('codes/cycles.rb')
+        self.parser.setup(code)
+        program = self.parser.parse()
+        arena = AstArena.from_tree(program)
+        rebuilt = arena.node()
+        self.assertEqual(repr(program), repr(rebuilt))
+        self.assertEqual(program.generate(), rebuilt.generate())
+
+        view = arena.view()
+        self.assertIs(NodeProgram, view.type)
+        self.assertEqual(len(program.child), len(view.children()[0].children()))
+
+        uses = dict()
+        for node in program.walk():
+            if node._definition is not None:
+                uses[node.name_id] = uses.get(node.name_id, 0) + 1
+        counts = arena.use_counts(len(self.parser.symtable.names))
+        self.assertEqual(uses, {name_id: int(count) for name_id, count in enumerate(counts) if count})
+        self.assertEqual(sum(1 for node in program.walk() if isinstance(node, NodeVariable) and node._definition),
+                         sum(1 for i in arena.nodes_of_type(NodeVariable) if arena.is_use[i]))
+
+    def test_hashConsing(self):
+        self.parser.setup('a = 1\nputs(a + 1)\nputs(a + 1)\nputs(a + 1)\n')
+        program = self.parser.parse()
+        factory = NodeFactory()
+        shared = factory.intern(program)
+        self.assertEqual(repr(program), repr(shared))
+        self.assertEqual(program.generate(), shared.generate())
+        self.assertIs(shared, factory.intern(program))
+
+        sums = [node for node in shared.walk() if isinstance(node, NodePlus)]
+        self.assertEqual(3, len(sums))
+        self.assertTrue(all(node is sums[0] for node in sums))
+        self.assertLess(len(factory), sum(1 for _ in program.walk()))
+        self.assertLess(sum(ast_memory(shared).values()), sum(ast_memory(program).values()))
+
+        # Hashes depend only on the structure, so they stay the same between runs
+        one = factory.make(NodeInteger, '1')
+        self.assertIs(one, sums[0].right)
+        other = NodeFactory()
+        self.assertEqual(factory.hash(one), other.hash(other.make(NodeInteger, '1')))
+        self.assertNotEqual(factory.hash(one), factory.hash(factory.make(NodeInteger, '2')))
+
+        # Children must be shared nodes of the same factory
+        self.assertRaises(ValueError, factory.make, NodePlus, NodeInteger('1'), one)
+        self.assertRaises(ValueError, factory.make, NodePlus, one, other.make(NodeInteger, '1'))
+        self.assertRaises(ValueError, factory.hash, NodeInteger('1'))
+
+    def test_dumps(self):
+        self.parser.setup(read_code('codes/functions.rb') + '\n' + read_code('codes/cycles.rb'))
+        program = self.parser.parse()
+        out = io.StringIO()
+        dump_tree(program, out)
+        self.assertEqual(repr(program), out.getvalue())
+
+        out = io.StringIO()
+        dump_json(program, out)
+        tree = json.loads(out.getvalue())
+        self.assertEqual('NodeProgram', tree['type'])
+        self.assertEqual(len(program.child), len(tree['child']))
+
+        out = io.StringIO()
+        dump_json(program, out, max_depth=1)
+        self.assertTrue(all(child['truncated'] for child in json.loads(out.getvalue())['child']))
+
+        out = io.StringIO()
+        dump_sexpr(NodePlus(NodeVariable('a', 0), NodeInteger('1')), out)
+        self.assertEqual('(NodePlus :left (NodeVariable :id "a" :name_id 0) :right (NodeInteger :value "1"))\n',
+                         out.getvalue())
+
+        out = io.StringIO()
+        dump_tree(program, out, max_depth=1)
+        self.assertEqual(len(program.child), sum(line.endswith(' ...') for line in out.getvalue().splitlines()))
+
+    def test_deadFunctionWithBranches(self):
+        # Dead code elimination used to fail on the elsif list and else block of an unused function
+        for branches in ('  else\n    puts(x)\n', '  elsif a < 0\n    puts(x)\n'):
+            self.parser.setup('x = 1\ndef f(a)\n  if a > 0\n    puts(a)\n' + branches + '  end\nend\n')
+            self.assertEqual('', self.parser.parse().generate())
+            self.assertEqual(2, self.parser.removed_statements)
+
+    def test_deepNesting(self):
+        # Deeper than the Python recursion limit allows for recursive descent
+        depth = 20000
+        self.parser.setup('x = 1\n' + 'if x then\n' * depth + 'puts(x)\n' + 'end\n' * depth)
+        program = self.parser.parse()
+        self.assertEqual(depth + 4, len(program.iterate()))
+
+        self.parser.setup('x = ' + '(1 + ' * depth + '1' + ')' * depth + '\nputs(x)\n')
+        program = self.parser.parse()
+        self.assertEqual(f'x <- {depth + 1}\nprint(x)\n', program.generate())
+
+        depth = 100000
+        self.parser.setup('x = ' + '(' * depth + '1' + ')' * depth + '\nputs(-' + '(' * depth + 'x' + ')' * depth + ')\n')
+        program = self.parser.parse()
+        self.assertEqual(4, len(program.iterate()))
+
+        # The indents make the code and the tree quadratic in the depth
+        depth = 1500
+        self.parser.setup('x = 1\n' + 'while x do\n' * depth + 'puts(' * depth + 'x' + ')' * depth + '\n' + 'end\n' * depth)
+        program = self.parser.parse()
+        self.assertIn('\t' * depth + 'print(' * depth + 'x' + ')' * depth + '\n', program.generate())
+        self.assertIn('|\t' * (2 * depth) + '|+-NodeVariable', repr(program))
+
+    def test_expressionPrecedence(self):
+        cases = {
+            'x = 1 - 2 - 3 * 4 ** 2\nputs(x)\n': 'x <- -49\nprint(x)\n',
+            'x = -(1 + 2) * 3\nputs(x)\n': 'x <- -9\nprint(x)\n',
+        }
+        for code, expected in cases.items():
+            self.parser.setup(code)
+            self.assertEqual(expected, self.parser.parse().generate())
+
+        for code in ('x = 1 +\n', 'x = 1 2\n', 'x = (1 + 2\n', 'x =\n'):
+            self.parser.setup(code)
+            self.assertRaises(ParsingError, self.parser.parse)
+
+        self.parser.setup('x = 1 = 2\n')
+        self.assertRaisesRegex(ParsingError, "Был получен токен EQUALS, а ожидался литерал или функция!", self.parser.parse)
+
+    def test_cachedExpressionTypes(self):
+        self.parser.setup('s = "a"\nx = ' + ' + '.join(['s'] * 500) + '\nputs(x)\n')
+        value = self.parser.parse().child[1].right
+        self.assertTrue(value._types.string)
+        self.assertFalse(value._types.numeric)
+        self.assertIs(value.left._types, self.parser.get_node_types(value.left))
+
+        self.parser.setup('s = "a"\nx = s + (s + 1)\n')
+        self.assertRaises(ParsingError, self.parser.parse)
+        self.parser.setup('x = (1 + 2) * 3\n')
+        self.assertNotIn('_types', repr(self.parser.parse()))
+
+
+class RexGrammarTests(unittest.TestCase):
+    def test_tablesUpToDate(self):
+        with open(grammar.grammar_path, encoding='utf-8') as f:
+            generated = grammar.generate_tables(f.read())
+        with open(grammar.tables_path, encoding='utf-8') as f:
+            self.assertEqual(generated, f.read(), "Run `python -m rex.grammar` to regenerate the tables")
+
+    def test_firstAndFollow(self):
+        rules = grammar.read_grammar('s = a, { "COMMA", a }, [ "NEWLINE" ]; a = "ID" | "LPAR", s, "RPAR";')
+        first, nullable = grammar.first_sets(rules)
+        self.assertEqual({Special.ID, Special.LPAR}, first['s'])
+        self.assertEqual({'s': False, 'a': False}, nullable)
+        follow = grammar.follow_sets(rules, 's', Special.EOF, first, nullable)
+        self.assertEqual({Special.EOF, Special.RPAR}, follow['s'])
+        self.assertEqual({Special.COMMA, Special.NEWLINE, Special.EOF, Special.RPAR}, follow['a'])
+        self.assertEqual({}, grammar.ll1_conflicts(rules, first, nullable))
+        rules = grammar.read_grammar('s = "ID", "COMMA" | "ID";')
+        self.assertEqual({'s': {Special.ID}}, grammar.ll1_conflicts(rules, *grammar.first_sets(rules)))
+
+    def test_followSetsEndStatements(self):
+        # Statements and arguments end where the grammar says, on a semicolon and at the closing bracket of an array
+        parser = Parser()
+        parser.setup('x = 1; y = [x, 2 + 3]\nputs(y); puts(x)\n')
+        self.assertEqual('x <- 1\ny <- c(x, 5)\nprint(y)\nprint(x)\n', parser.parse().generate())
+
+    def test_statementDispatch(self):
+        self.assertEqual(set(Parser.stmt_parsers), set(STMT_DISPATCH.values()))
+        self.assertRaises(grammar.GrammarError, grammar.read_grammar, 's = "UNKNOWN";')
+        self.assertRaises(grammar.GrammarError, grammar.read_grammar, 's = t;')
+
 
 class RexSemanticTests(unittest.TestCase):
     def setUp(self) -> None:
@@ -500,6 +1066,23 @@ class RexSemanticTests(unittest.TestCase):
 
         self.assertTrue(False)
 
+    def test_shadowed_bindings(self):
+        symtable = SymTable()
+        x = symtable.names.intern("x")
+        outer, inner, redefined = Variable(NumericType), Variable(StringType), Variable(ArrayType)
+        symtable.add_variable(x, outer)
+        symtable.create_local_namespace()
+        symtable.add_variable(x, inner)
+        self.assertIs(inner, symtable.get_variable(x))
+        symtable.add_variable(x, redefined)
+        self.assertIs(redefined, symtable.get_variable(x))
+        symtable.dispose_local_namespace()
+        self.assertIs(outer, symtable.get_variable(x))
+        symtable.create_local_namespace()
+        symtable.add_variable(symtable.names.intern("y"), Variable(NumericType))
+        symtable.dispose_local_namespace()
+        self.assertRaises(SemanticError, symtable.get_variable, symtable.names.intern("y"))
+
 
 class RexGeneratorTests(unittest.TestCase):
     def setUp(self) -> None:
@@ -642,6 +1225,39 @@ class RexGeneratorTests(unittest.TestCase):
         parse_res = self.parser.parse()
         gen_res = parse_res.generate()
         self.assertEqual(gen_res, translated_r_code)
+        self.assertEqual(3, self.parser.removed_statements)
+        self.assertEqual(3, self.parser.removed_symbols)
+
+    def test_optimization_def_use_records(self):
+        code = '''
+            arr = []
+            x = arr[0]
+            y = 1
+            def foo()
+                a = y
+                puts(a)
+            end
+            puts(1)
+        '''
+
+        self.parser.setup(code)
+        self.assertEqual("print(1)\n", self.parser.parse().generate())
+        self.assertEqual(4, self.parser.removed_statements)
+
+        self.parser.setup("a = 1\nb = a\na = 2\nputs(a)\n")
+        program = self.parser.parse()
+        use = program.child[1].params.arguments[0]
+        self.assertIs(program.child[0]._defines, use._definition)
+        self.assertEqual([use], use._definition.uses)
+
+    def test_optimization_redefined_variables(self):
+        code = "a = 1\nb = a\na = 2\na = a + 1\n" * 2000 + "puts(a)\n"
+
+        self.parser.setup(code)
+        parse_res = self.parser.parse()
+        self.assertEqual(3, len(parse_res.child))
+        self.assertEqual(7998, self.parser.removed_statements)
+        self.assertEqual(1, self.parser.removed_symbols)
 
     def test_optimization_return_statement(self):
         code = '''